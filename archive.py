@@ -0,0 +1,121 @@
+import fnmatch
+import os
+import pathlib
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+IGNORE_FILE = ".releaseignore"
+# Never wanted in a release whatever .releaseignore says
+DEFAULT_IGNORE = [
+    ".git",
+    ".gitignore",
+    IGNORE_FILE,
+    "*-backups",
+    "fp-info-cache",
+    "*.lck",
+    "_autosave-*",
+    "~*",
+    "*.bak",
+    "__pycache__",
+]
+
+# Already compressed so not worth spending time on
+STORED_SUFFIXES = [
+    ".zip",
+    ".gz",
+    ".7z",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".webp",
+    ".pdf",
+    ".stpz",
+    ".wrz",
+]
+# Large text files which shrink a lot with the best compression
+BEST_SUFFIXES = [
+    ".kicad_pcb",
+    ".kicad_sch",
+    ".kicad_sym",
+    ".kicad_mod",
+    ".step",
+    ".stp",
+    ".wrl",
+    ".drl",
+    ".gbr",
+    ".net",
+]
+DEFAULT_LEVEL = 6
+BEST_LEVEL = 9
+
+
+def load_ignore_patterns(folder: pathlib.Path) -> list[str]:
+    patterns = list(DEFAULT_IGNORE)
+    try:
+        with open(folder / IGNORE_FILE) as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    patterns.append(line.rstrip("/"))
+    except OSError:
+        pass
+    return patterns
+
+
+def is_ignored(relative_path: pathlib.PurePath, patterns: list[str]) -> bool:
+    # Patterns containing a "/" match against the whole path,
+    # anything else against the file or folder name
+    for pattern in patterns:
+        if "/" in pattern:
+            if fnmatch.fnmatch(relative_path.as_posix(), pattern.lstrip("/")):
+                return True
+        elif fnmatch.fnmatch(relative_path.name, pattern):
+            return True
+    return False
+
+
+def iter_members(
+    folder: pathlib.Path, patterns: list[str]
+) -> Iterator[Tuple[pathlib.Path, str]]:
+    for root, dirs, files in os.walk(folder):
+        root_path = pathlib.Path(root)
+        relative_root = root_path.relative_to(folder)
+        # Prune ignored folders so they are never walked
+        dirs[:] = sorted(
+            x for x in dirs if not is_ignored(relative_root / x, patterns)
+        )
+        for x in sorted(files):
+            if not is_ignored(relative_root / x, patterns):
+                yield root_path / x, (relative_root / x).as_posix()
+
+
+def compression_for(path: pathlib.Path) -> Tuple[int, int]:
+    suffix = path.suffix.lower()
+    if suffix in STORED_SUFFIXES:
+        return zipfile.ZIP_STORED, 0
+    # Gerbers use the layer as a suffix e.g. .gtl
+    if suffix in BEST_SUFFIXES or suffix.startswith((".g", ".kicad_")):
+        return zipfile.ZIP_DEFLATED, BEST_LEVEL
+    return zipfile.ZIP_DEFLATED, DEFAULT_LEVEL
+
+
+def write_archive(
+    output_file: pathlib.Path, members: Iterable[Tuple[pathlib.Path, str]]
+):
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for path, arcname in members:
+            compress_type, compresslevel = compression_for(path)
+            # Streamed from disk in chunks by ZipFile
+            zip_file.write(
+                path,
+                arcname,
+                compress_type=compress_type,
+                compresslevel=compresslevel,
+            )
+
+
+def archive_folder(output_file: pathlib.Path, folder: pathlib.Path):
+    write_archive(
+        output_file, iter_members(folder, load_ignore_patterns(folder))
+    )
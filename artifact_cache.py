@@ -0,0 +1,177 @@
+import fnmatch
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import uuid
+from typing import Any, Callable, Optional, Tuple
+
+# Files which affect the output of kicad-cli exports
+INPUT_SUFFIXES = [
+    ".kicad_sch",
+    ".kicad_pcb",
+    ".kicad_pro",
+    ".kicad_dru",
+    ".kicad_sym",
+    ".kicad_mod",
+]
+INPUT_FILENAMES = ["fp-lib-table", "sym-lib-table"]
+# Folders never searched for projects or their inputs, extra globs can be
+# given with --prune
+DEFAULT_PRUNE = [".git", "*-backups", "__pycache__", "node_modules"]
+
+
+def is_input_file(name: str) -> bool:
+    return (
+        os.path.splitext(name)[1] in INPUT_SUFFIXES or name in INPUT_FILENAMES
+    )
+
+
+def is_pruned(name: str, patterns: list[str]) -> bool:
+    return any(fnmatch.fnmatch(name, x) for x in patterns)
+
+
+def scan_folder(
+    folder: str, patterns: list[str]
+) -> Tuple[list[str], list[str]]:
+    # Returns (input files, subfolders) found directly in folder, leaving out
+    # subfolders matching patterns. Shared by discovery and
+    # project_input_files so both see the same files.
+    files = []
+    folders = []
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                # Symlinked folders aren't followed so loops can't happen
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_pruned(entry.name, patterns):
+                        folders.append(entry.path)
+                elif is_input_file(entry.name):
+                    files.append(entry.path)
+    except OSError:
+        pass
+    return files, folders
+
+
+def project_input_files(
+    kicad_project: pathlib.Path, prune: Optional[list[str]] = None
+) -> list[pathlib.Path]:
+    # Skips DEFAULT_PRUNE and prune like discover_projects
+    patterns = DEFAULT_PRUNE + (prune or [])
+    results = []
+    pending = [str(kicad_project.parent)]
+    while pending:
+        files, folders = scan_folder(pending.pop(), patterns)
+        results += files
+        pending += folders
+    return sorted(pathlib.Path(x) for x in results)
+
+
+def hash_project_inputs(
+    kicad_project: pathlib.Path,
+    input_files: Optional[list[pathlib.Path]] = None,
+    prune: Optional[list[str]] = None,
+) -> str:
+    # input_files is the sorted result of project_input_files, if already
+    # known e.g. from discovery
+    if input_files is None:
+        input_files = project_input_files(kicad_project, prune)
+    digest = hashlib.sha256()
+    for x in input_files:
+        digest.update(str(x.relative_to(kicad_project.parent)).encode())
+        digest.update(b"\0")
+        with open(x, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    def __init__(
+        self,
+        cache_dir: pathlib.Path,
+        max_size: int,
+        tool_version: str,
+    ):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.tool_version = tool_version
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(
+        self,
+        input_hash: str,
+        stage: str,
+        options: Optional[dict[str, Any]] = None,
+    ) -> str:
+        digest = hashlib.sha256()
+        digest.update(input_hash.encode())
+        digest.update(self.tool_version.encode())
+        digest.update(stage.encode())
+        digest.update(json.dumps(options or {}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def restore(
+        self, key: str, output_folder: pathlib.Path, outputs: list[str]
+    ) -> bool:
+        entry = self.cache_dir / key
+        if not all((entry / x).is_file() for x in outputs):
+            return False
+
+        output_folder.mkdir(parents=True, exist_ok=True)
+        for x in outputs:
+            shutil.copy2(entry / x, output_folder / x)
+        # Mark as recently used for eviction
+        os.utime(entry)
+        return True
+
+    def store(self, key: str, output_folder: pathlib.Path, outputs: list[str]):
+        entry = self.cache_dir / key
+        if entry.exists():
+            return
+
+        # Copy into a private folder first so a half written entry
+        # is never visible to other processes
+        tmp_entry = self.cache_dir / f".tmp-{uuid.uuid4().hex}"
+        tmp_entry.mkdir()
+        try:
+            for x in outputs:
+                shutil.copy2(output_folder / x, tmp_entry / x)
+            tmp_entry.rename(entry)
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            if not entry.exists():
+                raise
+
+    def run(
+        self,
+        key: str,
+        output_folder: pathlib.Path,
+        outputs: list[str],
+        func: Callable,
+        *args,
+        **kwargs,
+    ):
+        result = func(*args, **kwargs)
+        self.store(key, output_folder, outputs)
+        return result
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for x in self.cache_dir.iterdir():
+            if not x.is_dir() or x.name.startswith(".tmp-"):
+                continue
+            size = sum(y.stat().st_size for y in x.iterdir())
+            entries.append((x.stat().st_mtime, size, x))
+            total_size += size
+
+        # Least recently used first
+        for _, size, x in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            print(f"Evicting {x.name} from artifact cache")
+            shutil.rmtree(x)
+            total_size -= size
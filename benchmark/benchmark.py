@@ -0,0 +1,301 @@
+import argparse
+import json
+import os
+import pathlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Optional
+
+from benchmark.synthetic_repo import create_repo
+from mousearch.fake_suppliers import FakeFarnellServer, FakeMouserServer
+
+# End-to-end benchmark of releaser.py on a synthetic repo, with kicad-cli,
+# InteractiveHtmlBom and the supplier APIs replaced by local stand-ins so it
+# runs on any Linux machine without KiCad, API keys or network access.
+
+PACKAGE_ROOT = pathlib.Path(__file__).parent.parent.absolute()
+METRICS_NAME = "release-metrics.json"
+
+# The real APIs allow 30 requests per minute (Mouser) and 2 per second
+# (Farnell), each request taking this long to answer
+MOUSER_RATE_LIMIT = 0.5
+FARNELL_RATE_LIMIT = 2
+SUPPLIER_LATENCY = 0.15
+# Releaser options also given to merge_release.py when sharding
+MERGE_FLAGS = ["--multi-page", "--refresh-stock"]
+MERGE_OPTIONS = [
+    "--cache-dir",
+    "--stock-ttl",
+    "--mouser-budget",
+    "--farnell-budget",
+]
+
+
+def install_stubs(work_folder: pathlib.Path) -> dict[str, str]:
+    # Returns the environment releaser.py should run with
+    bin_folder = work_folder / "bin"
+    bin_folder.mkdir()
+    kicad_cli = bin_folder / "kicad-cli"
+    with open(kicad_cli, "w") as file:
+        file.write(
+            "#!/bin/sh\n"
+            f'exec "{sys.executable}" -m benchmark.fake_kicad_cli "$@"\n'
+        )
+    kicad_cli.chmod(0o755)
+
+    # releaser.py imports ibom from ../ibom relative to the project repo,
+    # or runs it as a script
+    ibom_folder = work_folder / "ibom" / "InteractiveHtmlBom"
+    ibom_folder.mkdir(parents=True)
+    (ibom_folder / "__init__.py").touch()
+    with open(ibom_folder / "generate_interactive_bom.py", "w") as file:
+        file.write(
+            "import sys\n\n"
+            f'sys.path.insert(0, "{PACKAGE_ROOT}")\n'
+            "from benchmark.fake_ibom import main  # noqa: E402\n\n"
+            'if __name__ == "__main__":\n'
+            "    sys.exit(main())\n"
+        )
+
+    env = dict(os.environ)
+    env["PATH"] = f"{bin_folder}{os.pathsep}{env['PATH']}"
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(PACKAGE_ROOT), *filter(None, [env.get("PYTHONPATH")])]
+    )
+    return env
+
+
+def merge_args(releaser_args: list[str]) -> list[str]:
+    # The releaser options merge_release.py shares
+    results = []
+    args = iter(releaser_args)
+    for x in args:
+        name = x.split("=", 1)[0]
+        if name in MERGE_FLAGS:
+            results.append(x)
+        elif name in MERGE_OPTIONS:
+            results.append(x)
+            if "=" not in x:
+                results.append(next(args))
+    return results
+
+
+def run_release(
+    repo: pathlib.Path,
+    release_folder: pathlib.Path,
+    env: dict[str, str],
+    releaser_args: list[str],
+    shards: int = 1,
+) -> tuple[float, dict[str, Any]]:
+    # Returns the end-to-end time and the release's own metrics. Shards are
+    # run side by side as separate processes, then merged.
+    shutil.rmtree(release_folder, ignore_errors=True)
+    start_time = time.perf_counter()
+    command = [
+        sys.executable,
+        PACKAGE_ROOT / "releaser.py",
+        ".",
+        release_folder,
+        "benchmark-mouser-key",
+        "benchmark-farnell-key",
+        *releaser_args,
+    ]
+    if shards == 1:
+        subprocess.run(
+            command, cwd=repo, env=env, check=True, stdout=subprocess.DEVNULL
+        )
+    else:
+        shard_folders = [
+            release_folder.with_name(f"{release_folder.name}-shard{x}")
+            for x in range(1, shards + 1)
+        ]
+        processes = []
+        for index, shard_folder in enumerate(shard_folders, 1):
+            shutil.rmtree(shard_folder, ignore_errors=True)
+            command[3] = shard_folder
+            processes.append(
+                subprocess.Popen(
+                    [*command, "--shard", f"{index}/{shards}"],
+                    cwd=repo,
+                    env=env,
+                    stdout=subprocess.DEVNULL,
+                )
+            )
+        for x in processes:
+            if x.wait():
+                raise subprocess.CalledProcessError(x.returncode, x.args)
+        # Shards leave the supplier check and webpage to the merge
+        subprocess.run(
+            [
+                sys.executable,
+                PACKAGE_ROOT / "merge_release.py",
+                ".",
+                release_folder,
+                *shard_folders,
+                "--mouser-key",
+                "benchmark-mouser-key",
+                "--farnell-key",
+                "benchmark-farnell-key",
+                *merge_args(releaser_args),
+            ],
+            cwd=repo,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+    duration = time.perf_counter() - start_time
+    with open(release_folder / METRICS_NAME) as file:
+        return duration, json.load(file)
+
+
+def print_results(
+    durations: list[float],
+    metrics: dict[str, Any],
+    mouser: FakeMouserServer,
+    farnell: FakeFarnellServer,
+):
+    print(f"\n{'Stage':<30} {'Tasks':>6} {'Wall (s)':>10} {'CPU (s)':>10}")
+    for x in metrics["stages"]:
+        print(
+            f"{x['stage']:<30} {x['tasks']:>6} "
+            f"{x['wall_time']:>10.1f} {x['cpu_time']:>10.1f}"
+        )
+
+    print(f"\n{'Supplier':<30} {'Requests':>10} {'Rejected':>10}")
+    for name, server in [("mouser", mouser), ("farnell", farnell)]:
+        print(
+            f"{name:<30} {server.request_count:>10} "
+            f"{server.rejected_count:>10}"
+        )
+
+    print(
+        f"\nEnd-to-end release time over {len(durations)} run(s): "
+        f"min {min(durations):.1f}s, median {statistics.median(durations):.1f}s"
+        f", max {max(durations):.1f}s"
+    )
+
+
+def main(
+    boards: int,
+    bom_lines: int,
+    shared_fraction: float,
+    runs: int,
+    releaser_args: list[str],
+    draft: bool,
+    output_file: Optional[pathlib.Path],
+    keep: bool,
+    shards: int = 1,
+):
+    work_folder = pathlib.Path(tempfile.mkdtemp(prefix="releaser-benchmark-"))
+    try:
+        repo = work_folder / "repo"
+        repo.mkdir()
+        catalogue = create_repo(
+            repo, boards, bom_lines, shared_fraction, release=not draft
+        )
+        print(
+            f"Generated {boards} boards with {bom_lines} BOM lines each "
+            f"({len(catalogue)} parts stocked) in {repo}"
+        )
+        env = install_stubs(work_folder)
+
+        durations = []
+        with (
+            FakeMouserServer(
+                catalogue,
+                rate_limit=MOUSER_RATE_LIMIT,
+                latency=SUPPLIER_LATENCY,
+            ) as mouser,
+            FakeFarnellServer(
+                catalogue,
+                rate_limit=FARNELL_RATE_LIMIT,
+                latency=SUPPLIER_LATENCY,
+            ) as farnell,
+        ):
+            env["MOUSER_API_URL"] = mouser.url
+            env["FARNELL_API_URL"] = farnell.url
+            for run in range(runs):
+                duration, metrics = run_release(
+                    repo, work_folder / "build", env, releaser_args, shards
+                )
+                print(f"Run {run + 1}/{runs} took {duration:.1f}s")
+                durations.append(duration)
+            print_results(durations, metrics, mouser, farnell)
+
+        if output_file:
+            with open(output_file, "w") as file:
+                json.dump(
+                    {
+                        "boards": boards,
+                        "bom_lines": bom_lines,
+                        "shared_fraction": shared_fraction,
+                        "releaser_args": releaser_args,
+                        "shards": shards,
+                        "durations": durations,
+                        "metrics": metrics,
+                    },
+                    file,
+                    indent=4,
+                )
+    finally:
+        if keep:
+            print(f"Benchmark files kept in {work_folder}")
+        else:
+            shutil.rmtree(work_folder)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark releaser.py against stubbed KiCad and suppliers",
+        epilog="Arguments after -- are passed to releaser.py, "
+        "e.g. -- --jobs 4 --no-jobsets",
+    )
+    parser.add_argument("--boards", type=int, default=4)
+    parser.add_argument("--bom-lines", type=int, default=40)
+    parser.add_argument(
+        "--shared-fraction",
+        type=float,
+        default=0.3,
+        help="Fraction of each board's BOM lines shared with other boards",
+    )
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Release with --shard i/N in this many processes, then merge",
+    )
+    parser.add_argument(
+        "--draft",
+        action="store_true",
+        help="Commit without RELEASE: so schematics are watermarked",
+    )
+    parser.add_argument(
+        "--output",
+        type=pathlib.Path,
+        help="Write the durations and the last run's metrics to this file",
+    )
+    parser.add_argument(
+        "--keep",
+        action="store_true",
+        help="Keep the generated repo and release for inspection",
+    )
+    args, releaser_args = parser.parse_known_args()
+    if releaser_args[:1] == ["--"]:
+        releaser_args = releaser_args[1:]
+
+    main(
+        boards=args.boards,
+        bom_lines=args.bom_lines,
+        shared_fraction=args.shared_fraction,
+        runs=args.runs,
+        releaser_args=releaser_args,
+        draft=args.draft,
+        output_file=args.output,
+        keep=args.keep,
+        shards=args.shards,
+    )
@@ -0,0 +1,41 @@
+import argparse
+import pathlib
+import sys
+
+from benchmark.fake_kicad_cli import footprint_count, work, write_filler
+
+# Stand-in for InteractiveHtmlBom's generate_interactive_bom.py, importable
+# as InteractiveHtmlBom.generate_interactive_bom like the real one
+
+# Importing pcbnew and wx, paid once per process
+IMPORT_DELAY = 1.0
+# Parsing the board, paid for every board
+BOARD_DELAY = 0.5
+HTML_BYTES = 3000  # Per footprint
+
+work(IMPORT_DELAY)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dest-dir", type=pathlib.Path, required=True)
+    parser.add_argument("--name-format", required=True)
+    parser.add_argument("--netlist-file", type=pathlib.Path)
+    args, _ = parser.parse_known_args()
+    # The board is always last, other options are ignored
+    pcb = pathlib.Path(sys.argv[-1])
+
+    if args.netlist_file:
+        assert args.netlist_file.is_file(), f"{args.netlist_file} missing"
+    work(BOARD_DELAY)
+    args.dest_dir.mkdir(parents=True, exist_ok=True)
+    write_filler(
+        args.dest_dir / f"{args.name_format}.html",
+        '<tr><td>R1</td><td>10k</td><td>"MPN"</td></tr>\n',
+        footprint_count(pcb) * HTML_BYTES,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
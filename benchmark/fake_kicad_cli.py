@@ -0,0 +1,248 @@
+import json
+import os
+import pathlib
+import re
+import sys
+import time
+
+import pypdf
+from PIL import Image
+
+# Stand-in for kicad-cli used by the benchmark. It accepts the commands
+# releaser.py runs, takes roughly as long as KiCad would (spinning a CPU
+# rather than sleeping so parallel exports compete for cores the same way)
+# and writes outputs of a realistic size. Configured from the environment:
+#   KICAD_STUB_VERSION      Version to report, defaults to 9.0.0
+#   KICAD_STUB_DELAY_SCALE  Multiplier for every delay, defaults to 1
+#   KICAD_STUB_SIZE_SCALE   Multiplier for every output size, defaults to 1
+#   KICAD_STUB_SLEEP        Set to 1 to sleep instead of using a CPU
+
+# Seconds to load a file, then for each export
+LOAD_DELAYS = {"pcb": 1.0, "sch": 0.5}
+EXPORT_DELAYS = {
+    "gerbers": 0.6,
+    "drill": 0.1,
+    "step": 3.0,
+    "render": 2.0,
+    "render_high": 6.0,
+    "pdf": 0.8,
+    "netlist": 0.2,
+    "bom": 0.2,
+}
+
+# Bytes per footprint on the board for each text output
+GERBER_LAYERS = ["gtl", "gbl", "gts", "gbs", "gto", "gbo", "gtp", "gbp", "gm1"]
+GERBER_BYTES = 1500
+DRILL_BYTES = 200
+STEP_BYTES = 40000
+RENDER_SIZES = {"render": (1600, 1200), "render_high": (2400, 1800)}
+
+
+def delay_scale() -> float:
+    return float(os.environ.get("KICAD_STUB_DELAY_SCALE", 1))
+
+
+def size_scale() -> float:
+    return float(os.environ.get("KICAD_STUB_SIZE_SCALE", 1))
+
+
+def work(seconds: float):
+    seconds *= delay_scale()
+    if os.environ.get("KICAD_STUB_SLEEP") == "1":
+        time.sleep(seconds)
+        return
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        sum(range(1000))
+
+
+def option(args: list[str], *names: str) -> str:
+    for name in names:
+        if name in args:
+            return args[args.index(name) + 1]
+    raise SystemExit(f"Missing option {names[0]}")
+
+
+def input_file(args: list[str], suffix: str) -> pathlib.Path:
+    for x in reversed(args):
+        if x.endswith(suffix):
+            return pathlib.Path(x)
+    raise SystemExit(f"No {suffix} file given")
+
+
+def footprint_count(pcb: pathlib.Path) -> int:
+    with open(pcb) as file:
+        return max(file.read().count("(footprint "), 1)
+
+
+def schematic_mpns(schematic: pathlib.Path) -> dict[str, int]:
+    with open(schematic) as file:
+        mpns = re.findall(r'\(property "MPN" "([^"]*)"', file.read())
+    results: dict[str, int] = {}
+    for x in mpns:
+        results[x] = results.get(x, 0) + 1
+    return results
+
+
+def write_filler(output_file: pathlib.Path, line: str, size: float):
+    count = max(int(size * size_scale() / len(line)), 1)
+    with open(output_file, "w") as file:
+        for _ in range(count):
+            file.write(line)
+
+
+def export_gerbers(pcb: pathlib.Path, folder: pathlib.Path):
+    work(EXPORT_DELAYS["gerbers"])
+    folder.mkdir(parents=True, exist_ok=True)
+    size = footprint_count(pcb) * GERBER_BYTES
+    for x in GERBER_LAYERS:
+        write_filler(folder / f"{pcb.stem}.{x}", "X012345Y067890D01*\n", size)
+    with open(folder / f"{pcb.stem}-job.gbrjob", "w") as file:
+        json.dump({"Header": {"GenerationSoftware": "stub"}}, file)
+
+
+def export_drill(pcb: pathlib.Path, folder: pathlib.Path):
+    work(EXPORT_DELAYS["drill"])
+    folder.mkdir(parents=True, exist_ok=True)
+    size = footprint_count(pcb) * DRILL_BYTES
+    for x in ["PTH", "NPTH"]:
+        write_filler(folder / f"{pcb.stem}-{x}.drl", "X12.345Y67.89\n", size)
+
+
+def export_step(pcb: pathlib.Path, output_file: pathlib.Path):
+    work(EXPORT_DELAYS["step"])
+    write_filler(
+        output_file,
+        "#1=CARTESIAN_POINT('',(1.234567,8.901234,0.));\n",
+        footprint_count(pcb) * STEP_BYTES,
+    )
+
+
+def export_render(output_file: pathlib.Path, high_quality: bool):
+    stage = "render_high" if high_quality else "render"
+    work(EXPORT_DELAYS[stage])
+    width, height = (
+        round(x * size_scale() ** 0.5) for x in RENDER_SIZES[stage]
+    )
+    # Upscaled noise compresses about as well as a real render
+    noise = Image.effect_noise((width // 8, height // 8), 24).resize(
+        (width, height), Image.Resampling.BILINEAR
+    )
+    Image.merge("RGB", [noise, noise.rotate(180), noise]).save(
+        output_file, compress_level=1
+    )
+
+
+def export_pdf(schematic: pathlib.Path, output_file: pathlib.Path):
+    work(EXPORT_DELAYS["pdf"])
+    writer = pypdf.PdfWriter()
+    # A3 landscape, one page per 200 symbols
+    symbols = sum(schematic_mpns(schematic).values())
+    for _ in range(1 + symbols // 200):
+        writer.add_blank_page(width=1190.55, height=841.89)
+    writer.write(output_file)
+
+
+def export_netlist(schematic: pathlib.Path, output_file: pathlib.Path):
+    work(EXPORT_DELAYS["netlist"])
+    with open(output_file, "w") as file:
+        file.write('(export (version "E")\n  (components\n')
+        for mpn, quantity in schematic_mpns(schematic).items():
+            for x in range(quantity):
+                file.write(f'    (comp (ref "{mpn}-{x}") (value "{mpn}"))\n')
+        file.write("  )\n)\n")
+
+
+def export_bom(schematic: pathlib.Path, output_file: pathlib.Path):
+    work(EXPORT_DELAYS["bom"])
+    with open(output_file, "w") as file:
+        file.write('"MPN","Qty"\n')
+        for mpn, quantity in schematic_mpns(schematic).items():
+            file.write(f'"{mpn}","{quantity}"\n')
+
+
+def run_job(project: pathlib.Path, job: dict, output_folder: pathlib.Path):
+    settings = job["settings"]
+    output = output_folder / settings["output_filename"]
+    pcb = project.with_suffix(".kicad_pcb")
+    schematic = project.with_suffix(".kicad_sch")
+    match job["type"]:
+        case "pcb_export_gerbers":
+            export_gerbers(pcb, output)
+        case "pcb_export_drill":
+            export_drill(pcb, output)
+        case "pcb_export_3d":
+            export_step(pcb, output)
+        case "pcb_render":
+            export_render(output, settings.get("quality") == "high")
+        case "sch_export_plot_pdf":
+            export_pdf(schematic, output)
+        case "sch_export_netlist":
+            export_netlist(schematic, output)
+        case _:
+            raise SystemExit(f"Unsupported job {job['type']}")
+
+
+def run_jobset(jobset_file: pathlib.Path, project: pathlib.Path):
+    with open(jobset_file) as file:
+        jobset = json.load(file)
+    output_folder = pathlib.Path(
+        jobset["outputs"][0]["settings"]["output_path"]
+    )
+    jobs = jobset["jobs"]
+    # The point of a jobset, each file is only loaded once
+    if any(x["type"].startswith("pcb_") for x in jobs):
+        work(LOAD_DELAYS["pcb"])
+    if any(x["type"].startswith("sch_") for x in jobs):
+        work(LOAD_DELAYS["sch"])
+    for x in jobs:
+        run_job(project, x, output_folder)
+
+
+def main(args: list[str]):
+    if args == ["version"]:
+        print(os.environ.get("KICAD_STUB_VERSION", "9.0.0"))
+        return
+
+    match args[:3]:
+        case ["jobset", "run", *_]:
+            run_jobset(
+                pathlib.Path(option(args, "--file")),
+                input_file(args, ".kicad_pro"),
+            )
+        case ["pcb", "render", *_]:
+            work(LOAD_DELAYS["pcb"])
+            export_render(
+                pathlib.Path(option(args, "-o", "--output")),
+                "--quality" in args and option(args, "--quality") == "high",
+            )
+        case ["pcb", "export", kind]:
+            pcb = input_file(args, ".kicad_pcb")
+            output = pathlib.Path(option(args, "-o", "--output"))
+            work(LOAD_DELAYS["pcb"])
+            if kind == "gerbers":
+                export_gerbers(pcb, output)
+            elif kind == "drill":
+                export_drill(pcb, output)
+            elif kind == "step":
+                export_step(pcb, output)
+            else:
+                raise SystemExit(f"Unsupported export {kind}")
+        case ["sch", "export", kind]:
+            schematic = input_file(args, ".kicad_sch")
+            output = pathlib.Path(option(args, "-o", "--output"))
+            work(LOAD_DELAYS["sch"])
+            if kind == "pdf":
+                export_pdf(schematic, output)
+            elif kind == "netlist":
+                export_netlist(schematic, output)
+            elif kind == "bom":
+                export_bom(schematic, output)
+            else:
+                raise SystemExit(f"Unsupported export {kind}")
+        case _:
+            raise SystemExit(f"Unsupported command {' '.join(args)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
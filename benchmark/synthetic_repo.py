@@ -0,0 +1,169 @@
+import json
+import pathlib
+import random
+import subprocess
+import uuid
+
+# Generates a git repo of KiCad projects for benchmarking. Only enough of
+# each file format is written for the stub kicad-cli and the releaser's own
+# parsing, the projects won't open in KiCad.
+
+REFERENCE_PREFIXES = ["R", "C", "U", "D", "L", "Q", "J"]
+
+
+def mpn_pool(
+    boards: int, bom_lines: int, shared_fraction: float, seed: int = 0
+) -> list[list[str]]:
+    # BOM lines per board, shared_fraction of each board's lines come from
+    # a pool common to every board (resistors, decoupling caps etc.)
+    rng = random.Random(seed)
+    shared_count = round(bom_lines * shared_fraction)
+    shared = [f"SHARED-{x:05d}" for x in range(max(shared_count * 2, 1))]
+    results = []
+    for board in range(boards):
+        lines = rng.sample(shared, shared_count)
+        lines += [
+            f"BOARD{board:03d}-{x:05d}"
+            for x in range(bom_lines - shared_count)
+        ]
+        results.append(lines)
+    return results
+
+
+def catalogue_for(boms: list[list[str]], seed: int = 0) -> dict[str, int]:
+    # Stock for every MPN, a few are out of stock or unknown to the suppliers
+    rng = random.Random(seed)
+    catalogue = {}
+    for mpn in sorted({x for bom in boms for x in bom}):
+        roll = rng.random()
+        if roll < 0.05:
+            continue
+        catalogue[mpn] = 0 if roll < 0.15 else rng.randint(1, 50000)
+    return catalogue
+
+
+def symbol(reference: str, mpn: str, x: float, y: float) -> str:
+    return f"""\t(symbol
+\t\t(lib_id "Device:{reference.rstrip('0123456789')}")
+\t\t(at {x:.2f} {y:.2f} 0)
+\t\t(unit 1)
+\t\t(exclude_from_sim no)
+\t\t(in_bom yes)
+\t\t(on_board yes)
+\t\t(dnp no)
+\t\t(uuid "{uuid.uuid4()}")
+\t\t(property "Reference" "{reference}"
+\t\t\t(at {x:.2f} {y - 2.54:.2f} 0)
+\t\t)
+\t\t(property "Value" "{mpn}"
+\t\t\t(at {x:.2f} {y + 2.54:.2f} 0)
+\t\t)
+\t\t(property "Footprint" "Resistor_SMD:R_0603_1608Metric"
+\t\t\t(at {x:.2f} {y:.2f} 0)
+\t\t\t(hide yes)
+\t\t)
+\t\t(property "MPN" "{mpn}"
+\t\t\t(at {x:.2f} {y:.2f} 0)
+\t\t\t(hide yes)
+\t\t)
+\t)
+"""
+
+
+def footprint(reference: str, x: float, y: float) -> str:
+    pads = "".join(
+        f'\t\t(pad "{n}" smd roundrect (at {n * 1.6 - 2.4:.2f} 0) '
+        '(size 0.8 0.95) (layers "F.Cu" "F.Paste" "F.Mask") '
+        f'(roundrect_rratio 0.25) (uuid "{uuid.uuid4()}"))\n'
+        for n in range(1, 3)
+    )
+    return (
+        '\t(footprint "Resistor_SMD:R_0603_1608Metric"\n'
+        '\t\t(layer "F.Cu")\n'
+        f'\t\t(uuid "{uuid.uuid4()}")\n'
+        f"\t\t(at {x:.2f} {y:.2f})\n"
+        f'\t\t(property "Reference" "{reference}" (at 0 -1.43 0) '
+        '(layer "F.SilkS"))\n'
+        f"{pads}\t)\n"
+    )
+
+
+def write_project(
+    folder: pathlib.Path, name: str, bom: list[str], seed: int = 0
+) -> pathlib.Path:
+    rng = random.Random(seed)
+    folder.mkdir(parents=True, exist_ok=True)
+    symbols = []
+    footprints = []
+    counts: dict[str, int] = {}
+    for line, mpn in enumerate(bom):
+        prefix = REFERENCE_PREFIXES[line % len(REFERENCE_PREFIXES)]
+        for _ in range(rng.randint(1, 8)):
+            counts[prefix] = counts.get(prefix, 0) + 1
+            reference = f"{prefix}{counts[prefix]}"
+            x = 25.4 + (len(symbols) % 40) * 7.62
+            y = 25.4 + (len(symbols) // 40) * 7.62
+            symbols.append(symbol(reference, mpn, x, y))
+            footprints.append(footprint(reference, x, y))
+
+    project = folder / f"{name}.kicad_pro"
+    with open(project, "w") as file:
+        json.dump(
+            {"meta": {"filename": project.name, "version": 1}}, file, indent=2
+        )
+    with open(project.with_suffix(".kicad_sch"), "w") as file:
+        file.write(
+            "(kicad_sch\n"
+            "\t(version 20231120)\n"
+            '\t(generator "eeschema")\n'
+            f'\t(uuid "{uuid.uuid4()}")\n'
+            '\t(paper "A3")\n'
+            "\t(lib_symbols)\n"
+            f"{''.join(symbols)})\n"
+        )
+    with open(project.with_suffix(".kicad_pcb"), "w") as file:
+        file.write(
+            "(kicad_pcb\n"
+            "\t(version 20240108)\n"
+            '\t(generator "pcbnew")\n'
+            f"{''.join(footprints)})\n"
+        )
+    return project
+
+
+def create_repo(
+    folder: pathlib.Path,
+    boards: int,
+    bom_lines: int,
+    shared_fraction: float = 0.3,
+    release: bool = True,
+    seed: int = 0,
+) -> dict[str, int]:
+    # Returns the supplier catalogue for every MPN used
+    boms = mpn_pool(boards, bom_lines, shared_fraction, seed)
+    for board, bom in enumerate(boms):
+        name = f"board{board:03d}"
+        write_project(folder / "hardware" / name, name, bom, seed + board)
+    with open(folder / "README.md", "w") as file:
+        file.write(
+            f"# Benchmark\n{boards} boards with {bom_lines} BOM lines each\n"
+        )
+
+    message = "RELEASE: benchmark" if release else "Benchmark draft"
+    for command in [
+        ["git", "init", "-q"],
+        ["git", "add", "."],
+        [
+            "git",
+            "-c",
+            "user.name=benchmark",
+            "-c",
+            "user.email=benchmark@localhost",
+            "commit",
+            "-q",
+            "-m",
+            message,
+        ],
+    ]:
+        subprocess.check_output(command, cwd=folder)
+    return catalogue_for(boms, seed)
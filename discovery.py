@@ -0,0 +1,91 @@
+import bisect
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from artifact_cache import DEFAULT_PRUNE, hash_project_inputs, scan_folder
+
+
+class ProjectInfo:
+    # A KiCad project found by discover_projects, with what later
+    # stages would otherwise have to walk the project folder again for
+    def __init__(
+        self,
+        path: pathlib.Path,
+        has_schematic: bool,
+        has_pcb: bool,
+        input_files: list[pathlib.Path],
+        input_hash: Optional[str] = None,
+    ):
+        self.path = path
+        self.has_schematic = has_schematic
+        self.has_pcb = has_pcb
+        # As artifact_cache.project_input_files returns given the same prune
+        self.input_files = input_files
+        self.input_hash = input_hash
+
+
+def walk_folder(
+    folder: str, patterns: list[str]
+) -> Tuple[list[str], list[str], list[str]]:
+    # Returns (projects, other files, subfolders) found directly in folder
+    files, folders = scan_folder(folder, patterns)
+    projects = [x for x in files if x.endswith(".kicad_pro")]
+    files = [x for x in files if not x.endswith(".kicad_pro")]
+    return projects, files, folders
+
+
+def discover_projects(
+    top_level_folder: pathlib.Path,
+    prune: Optional[list[str]] = None,
+    hash_inputs: bool = False,
+    workers: int = 8,
+) -> list[ProjectInfo]:
+    # Walks the tree once with os.scandir, skipping folders matching
+    # DEFAULT_PRUNE or prune. Each level of the tree is read by a pool of
+    # threads, as is hashing each project's inputs if asked for.
+    patterns = DEFAULT_PRUNE + (prune or [])
+    projects = []
+    files = []
+    with ThreadPoolExecutor(workers) as pool:
+        pending = [str(top_level_folder)]
+        while pending:
+            folders = pending
+            pending = []
+            for found_projects, found_files, found_folders in pool.map(
+                lambda x: walk_folder(x, patterns), folders
+            ):
+                projects += found_projects
+                files += found_files
+                pending += found_folders
+
+        # Project files are inputs too, sorted so each project folder's
+        # files are next to each other
+        files = sorted(pathlib.Path(x) for x in files + projects)
+        found = set(files)
+        results = []
+        for x in sorted(pathlib.Path(x) for x in projects):
+            folder = x.parent.parts
+            input_files = []
+            for y in files[bisect.bisect_left(files, x.parent) :]:
+                if y.parts[: len(folder)] != folder:
+                    break
+                input_files.append(y)
+            results.append(
+                ProjectInfo(
+                    x,
+                    has_schematic=x.with_suffix(".kicad_sch") in found,
+                    has_pcb=x.with_suffix(".kicad_pcb") in found,
+                    input_files=input_files,
+                )
+            )
+        if hash_inputs:
+            for project, input_hash in zip(
+                results,
+                pool.map(
+                    lambda x: hash_project_inputs(x.path, x.input_files),
+                    results,
+                ),
+            ):
+                project.input_hash = input_hash
+    return results
@@ -0,0 +1,136 @@
+import functools
+import importlib
+import os
+import pathlib
+import resource
+import sys
+import time
+from types import ModuleType
+from typing import Optional
+
+from kicad_cli import Invocation, record_invocation, run_command
+
+# InteractiveHtmlBom is checked out beside the repo being released
+IBOM_SCRIPT = (
+    pathlib.Path("..")
+    / "ibom"
+    / "InteractiveHtmlBom"
+    / "generate_interactive_bom.py"
+)
+IBOM_OPTIONS = [
+    "--dark-mode",
+    "--highlight-pin1",
+    "all",
+    "--no-browser",
+    "--blacklist",
+    "JP*,LAYOUT*",
+    "--extra-fields",
+    "Manufacturer,MPN",
+    "--show-fields",
+    "Manufacturer,MPN,Value",
+    "--group-fields",
+    "MPN",
+    "--dnp-field",
+    "kicad_dnp",
+]
+
+
+def ibom_arguments(
+    kicad_project: pathlib.Path,
+    output_folder: pathlib.Path,
+    netlist_file: pathlib.Path,
+) -> list[str]:
+    return [
+        *IBOM_OPTIONS,
+        "--dest-dir",
+        str(output_folder.absolute()),
+        "--name-format",
+        kicad_project.stem,
+        "--netlist-file",
+        str(netlist_file.absolute()),
+        str(kicad_project.with_suffix(".kicad_pcb").absolute()),
+    ]
+
+
+@functools.cache
+def load_generator() -> Optional[ModuleType]:
+    # Imported once per worker process, so pcbnew is only loaded once
+    # however many boards the worker goes on to run. None if it can't be
+    # imported, ibom is then run as a separate process.
+    # Without a display or registering ibom as a KiCad plugin
+    os.environ.setdefault("INTERACTIVE_HTML_BOM_NO_DISPLAY", "1")
+    os.environ.setdefault("INTERACTIVE_HTML_BOM_CLI_MODE", "1")
+    sys.path.insert(0, str(IBOM_SCRIPT.parent.parent.absolute()))
+    try:
+        module = importlib.import_module(
+            "InteractiveHtmlBom.generate_interactive_bom"
+        )
+    except ImportError as e:
+        print(
+            f"Unable to import InteractiveHtmlBom ({e}), running it per board"
+        )
+        return None
+    return module if hasattr(module, "main") else None
+
+
+def reset_peak_memory():
+    # Linux resets this process's peak RSS when 5 is written to clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory() -> int:
+    # kB, since reset_peak_memory if it's supported
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_generator(module: ModuleType, name: str, arguments: list[str]):
+    # Runs generate_interactive_bom.py's main() as if from the command line
+    reset_peak_memory()
+    start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    argv = sys.argv
+    sys.argv = [str(IBOM_SCRIPT), *arguments]
+    try:
+        code = module.main()
+    except SystemExit as e:
+        code = e.code
+    finally:
+        sys.argv = argv
+    invocation = Invocation(
+        f"ibom {name}",
+        time.perf_counter() - start_time,
+        time.process_time() - start_cpu_time,
+        peak_memory(),
+        in_process=True,
+    )
+    record_invocation(invocation)
+    print(
+        f"ibom for {name} took {invocation.wall_time:.1f}s, peak memory "
+        f"{invocation.max_rss / 1024:.0f}MB"
+    )
+    if code:
+        raise RuntimeError(f"InteractiveHtmlBom failed for {name}: {code}")
+
+
+def generate_ibom(
+    kicad_project: pathlib.Path,
+    output_folder: pathlib.Path,
+    netlist_file: pathlib.Path,
+):
+    arguments = ibom_arguments(kicad_project, output_folder, netlist_file)
+    module = load_generator()
+    if module is None:
+        run_command(["python3", IBOM_SCRIPT, *arguments])
+    else:
+        run_generator(module, kicad_project.stem, arguments)
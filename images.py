@@ -0,0 +1,51 @@
+import pathlib
+
+from PIL import Image
+
+# Name: (maximum width in pixels, WebP quality)
+IMAGE_DERIVATIVES = {
+    "thumb": (320, 75),
+    "medium": (1200, 80),
+}
+
+
+def derivative_name(stem: str, side: str, size: str) -> str:
+    return f"{stem}-{side}-{size}.webp"
+
+
+def image_outputs(stem: str) -> list[str]:
+    results = []
+    for side in ["front", "back"]:
+        results.append(f"{stem}-{side}.png")
+        for size in IMAGE_DERIVATIVES:
+            results.append(derivative_name(stem, side, size))
+    return results
+
+
+def encode_derivative(
+    source: pathlib.Path, output_file: pathlib.Path, width: int, quality: int
+):
+    with Image.open(source) as image:
+        if image.width > width:
+            image = image.resize(
+                (width, round(image.height * width / image.width)),
+                Image.Resampling.LANCZOS,
+            )
+        image.save(output_file, "WEBP", quality=quality, method=6)
+
+
+def create_derivatives(
+    renders: dict[str, pathlib.Path],
+    output_folder: pathlib.Path,
+    stem: str,
+):
+    # renders maps side to the full resolution PNG. Encoded one after another
+    # as this already runs in one of the scheduler's worker processes.
+    for side, source in renders.items():
+        for size, (width, quality) in IMAGE_DERIVATIVES.items():
+            encode_derivative(
+                source,
+                output_folder / derivative_name(stem, side, size),
+                width,
+                quality,
+            )
@@ -0,0 +1,184 @@
+import json
+import os
+import pathlib
+import re
+import subprocess
+import time
+import uuid
+from typing import Any
+
+# Jobsets were added in KiCad 9
+JOBSET_MIN_VERSION = 9
+
+
+class Invocation:
+    def __init__(
+        self,
+        command: str,
+        wall_time: float,
+        cpu_time: float,
+        max_rss: int,
+        in_process: bool = False,
+    ):
+        # Times in seconds, max_rss in kB
+        self.command = command
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.max_rss = max_rss
+        # Run inside the task's own process rather than as a child, so its
+        # CPU time is already part of the task's
+        self.in_process = in_process
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "command": self.command,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "max_rss_kb": self.max_rss,
+            "in_process": self.in_process,
+        }
+
+
+# Every command run by this process since the last call to take_invocations
+_invocations: list[Invocation] = []
+
+
+def run_command(commands: list[str | pathlib.Path]):
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        commands,
+        # capture_output=True,
+    )
+    # Reap the child ourselves to get its resource usage
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    record_invocation(
+        Invocation(
+            " ".join(str(x) for x in commands[:4]),
+            time.perf_counter() - start_time,
+            usage.ru_utime + usage.ru_stime,
+            usage.ru_maxrss,
+        )
+    )
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, commands)
+
+
+def record_invocation(invocation: Invocation):
+    _invocations.append(invocation)
+
+
+def take_invocations() -> list[Invocation]:
+    results = list(_invocations)
+    _invocations.clear()
+    return results
+
+
+def kicad_cli_version() -> str:
+    return subprocess.check_output(["kicad-cli", "version"], text=True).strip()
+
+
+def supports_jobsets(version: str) -> bool:
+    match = re.match(r"(\d+)\.", version)
+    return bool(match) and int(match.group(1)) >= JOBSET_MIN_VERSION
+
+
+class KicadJob:
+    def __init__(
+        self,
+        job_type: str,
+        settings: dict[str, Any],
+        outputs: list[str],
+        command: list[str | pathlib.Path],
+    ):
+        # outputs are relative to the staging folder, those containing "*"
+        # are globs which must match at least one file. command is the
+        # equivalent standalone kicad-cli call used if the jobset can't be
+        # run.
+        self.id = str(uuid.uuid4())
+        self.job_type = job_type
+        self.settings = settings
+        self.outputs = outputs
+        self.command = command
+
+    def outputs_exist(self, staging: pathlib.Path) -> bool:
+        for x in self.outputs:
+            if "*" in x:
+                if not any(y.is_file() for y in staging.glob(x)):
+                    return False
+            elif not (staging / x).is_file():
+                return False
+        return True
+
+
+def write_jobset(
+    jobs: list[KicadJob], staging: pathlib.Path, jobset_file: pathlib.Path
+):
+    jobset = {
+        "jobs": [
+            {
+                "id": x.id,
+                "type": x.job_type,
+                "description": "",
+                "settings": x.settings,
+            }
+            for x in jobs
+        ],
+        "meta": {"version": 1},
+        "outputs": [
+            {
+                "id": str(uuid.uuid4()),
+                "type": "folder",
+                "description": "",
+                "only": [],
+                "settings": {"output_path": str(staging.absolute())},
+            }
+        ],
+    }
+    with open(jobset_file, "w") as file:
+        json.dump(jobset, file, indent=4)
+
+
+def run_jobset(
+    kicad_project: pathlib.Path, jobs: list[KicadJob], staging: pathlib.Path
+) -> bool:
+    # Project and libraries are only loaded once for every job
+    jobset_file = staging / f"{kicad_project.stem}.kicad_jobset"
+    write_jobset(jobs, staging, jobset_file)
+    try:
+        run_command(
+            [
+                "kicad-cli",
+                "jobset",
+                "run",
+                "--stop-on-error",
+                "--file",
+                jobset_file.absolute(),
+                kicad_project.absolute(),
+            ]
+        )
+    except subprocess.CalledProcessError:
+        return False
+    finally:
+        jobset_file.unlink(missing_ok=True)
+    return all(x.outputs_exist(staging) for x in jobs)
+
+
+def run_batch(
+    kicad_project: pathlib.Path,
+    jobs: list[KicadJob],
+    staging: pathlib.Path,
+    use_jobsets: bool,
+):
+    if use_jobsets:
+        if run_jobset(kicad_project, jobs, staging):
+            return
+        print(
+            f"Jobset for {kicad_project.stem} failed, "
+            "falling back to individual kicad-cli commands"
+        )
+
+    for x in jobs:
+        for output in x.outputs:
+            (staging / output).parent.mkdir(parents=True, exist_ok=True)
+        run_command(x.command)
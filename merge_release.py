@@ -0,0 +1,208 @@
+import argparse
+import json
+import pathlib
+import shutil
+from typing import Optional
+
+from metrics import (
+    METRICS_NAME,
+    merge_release_metrics,
+    metrics_table,
+    release_metrics,
+)
+from mousearch.bom import BomRow
+from mousearch.mousearch import Mousearch
+from release_context import ReleaseContext
+from release_manifest import load_manifest
+from releaser import bom_report, publish_release
+from scheduler import Scheduler
+from webpage import markdown_file
+
+# Combines the release folders written by releaser.py --shard i/N into one
+# release, checks supplier stock for every shard's BOMs at once and renders
+# the webpage for every board
+
+
+def load_shard(shard_folder: pathlib.Path, context: ReleaseContext) -> dict:
+    manifest = load_manifest(shard_folder)
+    assert (
+        manifest and "shard" in manifest
+    ), f"No shard manifest found in {shard_folder}"
+    assert manifest["commit"] == context.commit, (
+        f"{shard_folder} was released from {manifest['commit'][:7]}, "
+        f"not {context.short_commit}"
+    )
+    return manifest
+
+
+def merge_shards(
+    top_level_folder: pathlib.Path,
+    release_folder: pathlib.Path,
+    shard_folders: list[pathlib.Path],
+    multi_page: bool = False,
+    bom_checker: Optional[Mousearch] = None,
+):
+    context = ReleaseContext.from_repo(top_level_folder)
+    shards = sorted(
+        ((load_shard(x, context), x) for x in shard_folders),
+        key=lambda x: x[0]["shard"]["index"],
+    )
+    count = shards[0][0]["shard"]["count"]
+    found = [(x["shard"]["index"], x["shard"]["count"]) for x, _ in shards]
+    assert found == [
+        (x, count) for x in range(1, count + 1)
+    ], f"Expected shards 1/{count} to {count}/{count}, found {found}"
+
+    release_folder.mkdir(parents=True, exist_ok=True)
+    manifest_projects = {}
+    shard_metrics = []
+    for manifest, shard_folder in shards:
+        for name, project in manifest["projects"].items():
+            assert name not in manifest_projects, f"{name} is in two shards"
+            manifest_projects[name] = project
+            if shard_folder.resolve() == release_folder.resolve():
+                continue
+            for x in project["artifacts"]:
+                if (shard_folder / x).is_file():
+                    shutil.copy2(shard_folder / x, release_folder / x)
+        try:
+            with open(shard_folder / METRICS_NAME) as file:
+                shard_metrics.append(json.load(file))
+        except (OSError, ValueError):
+            print(f"No metrics found in {shard_folder}")
+    print(
+        f"Merged {len(manifest_projects)} projects from {count} shards "
+        f"into {release_folder.absolute()}"
+    )
+
+    # BOM rows the shards left for the supplier check
+    boms = {
+        name: [BomRow(*x) for x in project.pop("bom")]
+        for name, project in manifest_projects.items()
+        if "bom" in project
+    }
+    merge_metrics = None
+    if boms and bom_checker is None:
+        print(f"No supplier API keys, skipping stock for {len(boms)} projects")
+    elif boms:
+        # One process checks every board so shared parts are looked up once
+        # and the suppliers' rate limits and budgets hold
+        scheduler = Scheduler(jobs=1)
+        scheduler.add(
+            "suppliers",
+            "suppliers",
+            bom_checker.query_suppliers_for_projects,
+            [
+                bom_report(
+                    name,
+                    release_folder,
+                    (top_level_folder / manifest_projects[name]["path"])
+                    .with_suffix(".kicad_sch")
+                    .absolute(),
+                )
+                for name in boms
+            ],
+            boms=list(boms.values()),
+        )
+        scheduler.run()
+        scheduler.print_report()
+        merge_metrics = release_metrics(
+            context, scheduler, scheduler.results.get("suppliers")
+        )
+        for name in boms:
+            manifest_projects[name]["comment"] = markdown_file(
+                release_folder / f"{name}-bom.md"
+            )
+
+    metrics = merge_release_metrics(
+        release_folder / METRICS_NAME, context, shard_metrics, merge_metrics
+    )
+    # Same order as an unsharded release
+    manifest_projects = dict(
+        sorted(
+            manifest_projects.items(),
+            key=lambda x: pathlib.PurePath(x[1]["path"]),
+        )
+    )
+    publish_release(
+        context,
+        top_level_folder,
+        release_folder,
+        manifest_projects,
+        metrics_table(metrics),
+        multi_page=multi_page,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Combine the shards of a release made with --shard"
+    )
+    parser.add_argument("top_level_folder", type=pathlib.Path)
+    parser.add_argument("release_folder", type=pathlib.Path)
+    parser.add_argument("shard_folders", type=pathlib.Path, nargs="+")
+    parser.add_argument(
+        "--mouser-key",
+        default=None,
+        help="Mouser API key, with --farnell-key to check the shards' BOMs",
+    )
+    parser.add_argument("--farnell-key", default=None, help="Farnell API key")
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=None,
+        help="Folder to cache supplier stock lookups in between releases",
+    )
+    parser.add_argument(
+        "--stock-ttl",
+        type=float,
+        default=24,
+        help="Hours before a cached supplier stock lookup is checked again (default: 24)",
+    )
+    parser.add_argument(
+        "--refresh-stock",
+        action="store_true",
+        help="Query suppliers for every part even if a cached result exists",
+    )
+    parser.add_argument(
+        "--mouser-budget",
+        type=int,
+        default=None,
+        help="Most requests to send Mouser per release, the riskiest parts "
+        "are checked first and the rest carried over from the stock cache",
+    )
+    parser.add_argument(
+        "--farnell-budget",
+        type=int,
+        default=None,
+        help="Most requests to send Farnell per release, as --mouser-budget",
+    )
+    parser.add_argument(
+        "--multi-page",
+        action="store_true",
+        help="Give each board its own page linked from an index of thumbnails",
+    )
+    args = parser.parse_args()
+
+    if args.mouser_key and args.farnell_key:
+        bom_checker = Mousearch(
+            mouser_key=args.mouser_key,
+            farnell_key=args.farnell_key,
+            cache_path=(
+                args.cache_dir / "stock.sqlite" if args.cache_dir else None
+            ),
+            cache_ttl=args.stock_ttl * 60 * 60,
+            refresh_cache=args.refresh_stock,
+            mouser_budget=args.mouser_budget,
+            farnell_budget=args.farnell_budget,
+        )
+    else:
+        bom_checker = None
+
+    merge_shards(
+        top_level_folder=args.top_level_folder,
+        release_folder=args.release_folder,
+        shard_folders=args.shard_folders,
+        multi_page=args.multi_page,
+        bom_checker=bom_checker,
+    )
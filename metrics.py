@@ -0,0 +1,150 @@
+import json
+import pathlib
+import platform
+from typing import Any, Optional
+
+from mousearch.request_log import RequestLog
+from release_context import ReleaseContext
+from scheduler import Scheduler, Task
+
+METRICS_NAME = "release-metrics.json"
+
+
+def task_metrics(task: Task) -> dict[str, Any]:
+    return {
+        "name": task.name,
+        "stage": task.stage,
+        "wall_time": task.duration,
+        "cpu_time": task.cpu_time,
+        "max_rss_kb": task.max_rss,
+        "output_bytes": task.output_bytes,
+        "commands": [x.as_dict() for x in task.invocations],
+    }
+
+
+def stage_metrics(scheduler: Scheduler) -> list[dict[str, Any]]:
+    stages: dict[str, dict[str, Any]] = {}
+    for x in scheduler.tasks.values():
+        if x.duration is None:
+            continue
+        stage = stages.setdefault(
+            x.stage,
+            {
+                "stage": x.stage,
+                "tasks": 0,
+                "wall_time": 0.0,
+                "cpu_time": 0.0,
+                "max_rss_kb": 0,
+                "output_bytes": 0,
+            },
+        )
+        stage["tasks"] += 1
+        stage["wall_time"] += x.duration
+        stage["cpu_time"] += x.cpu_time or 0
+        stage["max_rss_kb"] = max(stage["max_rss_kb"], x.max_rss)
+        stage["output_bytes"] += x.output_bytes
+    return sorted(stages.values(), key=lambda x: -x["wall_time"])
+
+
+def release_metrics(
+    context: ReleaseContext,
+    scheduler: Scheduler,
+    supplier_requests: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    return {
+        "commit": context.commit,
+        "host": platform.node(),
+        "jobs": scheduler.jobs,
+        "wall_time": scheduler.wall_time,
+        "stages": stage_metrics(scheduler),
+        "tasks": [
+            task_metrics(x)
+            for x in scheduler.tasks.values()
+            if x.duration is not None
+        ],
+        "suppliers": supplier_requests,
+    }
+
+
+def write_release_metrics(
+    output_file: pathlib.Path,
+    context: ReleaseContext,
+    scheduler: Scheduler,
+    supplier_requests: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    metrics = release_metrics(context, scheduler, supplier_requests)
+    with open(output_file, "w") as file:
+        json.dump(metrics, file, indent=4)
+    return metrics
+
+
+def merge_release_metrics(
+    output_file: pathlib.Path,
+    context: ReleaseContext,
+    shards: list[dict[str, Any]],
+    merge: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    # Combines release-metrics.json from each shard of a release. The wall
+    # time is the slowest shard's as they run side by side, plus that of
+    # merge, the release_metrics of the supplier check run after them.
+    parts = shards + ([merge] if merge else [])
+    stages: dict[str, dict[str, Any]] = {}
+    for part in parts:
+        for x in part["stages"]:
+            stage = stages.setdefault(
+                x["stage"],
+                {
+                    "stage": x["stage"],
+                    "tasks": 0,
+                    "wall_time": 0.0,
+                    "cpu_time": 0.0,
+                    "max_rss_kb": 0,
+                    "output_bytes": 0,
+                },
+            )
+            for key in ["tasks", "wall_time", "cpu_time", "output_bytes"]:
+                stage[key] += x[key]
+            stage["max_rss_kb"] = max(stage["max_rss_kb"], x["max_rss_kb"])
+
+    requests = RequestLog()
+    for part in parts:
+        if part.get("suppliers"):
+            requests.requests += part["suppliers"]["requests"]
+
+    wall_time = max(
+        (x["wall_time"] for x in shards if x["wall_time"] is not None),
+        default=None,
+    )
+    if wall_time is not None and merge and merge["wall_time"] is not None:
+        wall_time += merge["wall_time"]
+    metrics = {
+        "commit": context.commit,
+        "host": platform.node(),
+        "jobs": sum(x["jobs"] for x in shards),
+        "wall_time": wall_time,
+        "stages": sorted(stages.values(), key=lambda x: -x["wall_time"]),
+        "tasks": [y for x in parts for y in x["tasks"]],
+        "suppliers": requests.as_dict() if requests.requests else None,
+        "shards": [
+            {"host": x["host"], "jobs": x["jobs"], "wall_time": x["wall_time"]}
+            for x in shards
+        ],
+    }
+    with open(output_file, "w") as file:
+        json.dump(metrics, file, indent=4)
+    return metrics
+
+
+def metrics_table(metrics: dict[str, Any]) -> list[dict[str, str]]:
+    # Human readable rows for the webpage
+    return [
+        {
+            "stage": x["stage"],
+            "tasks": str(x["tasks"]),
+            "wallTime": f"{x['wall_time']:.1f}",
+            "cpuTime": f"{x['cpu_time']:.1f}",
+            "maxRss": f"{x['max_rss_kb'] / 1024:.0f}",
+            "outputSize": f"{x['output_bytes'] / (1024 * 1024):.1f}",
+        }
+        for x in metrics["stages"]
+    ]
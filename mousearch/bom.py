@@ -0,0 +1,84 @@
+import csv
+import pathlib
+from typing import Iterator, Optional
+
+MOUSER_BIT = 1 << 1
+FARNELL_BIT = 1 << 0
+
+
+class BomRow:
+    # One line of the BOM exported by kicad-cli, grouped by MPN
+    __slots__ = ("mpn", "quantity")
+
+    def __init__(self, mpn: str, quantity: int):
+        self.mpn = mpn
+        self.quantity = quantity
+
+
+class PartResult:
+    # Stock found for one BOM line, -1 if the supplier doesn't know the MPN
+    # and None if the lookup failed. Stock carried over from an earlier
+    # check, rather than looked up for this run, is flagged as such.
+    __slots__ = (
+        "mpn",
+        "quantity",
+        "mouser_stock",
+        "farnell_stock",
+        "mouser_carried",
+        "farnell_carried",
+    )
+
+    def __init__(
+        self,
+        mpn: str,
+        quantity: int,
+        mouser_stock: Optional[int],
+        farnell_stock: Optional[int],
+        mouser_carried: bool = False,
+        farnell_carried: bool = False,
+    ):
+        self.mpn = mpn
+        self.quantity = quantity
+        self.mouser_stock = mouser_stock
+        self.farnell_stock = farnell_stock
+        self.mouser_carried = mouser_carried
+        self.farnell_carried = farnell_carried
+
+    @property
+    def score(self) -> int:
+        # Used to sort results, parts nobody stocks first
+        score = 0
+        if self.stocked_at_mouser:
+            score += MOUSER_BIT
+        if self.stocked_at_farnell:
+            score += FARNELL_BIT
+        return score
+
+    @property
+    def failed(self) -> bool:
+        return self.mouser_stock is None or self.farnell_stock is None
+
+    @property
+    def carried_over(self) -> bool:
+        return self.mouser_carried or self.farnell_carried
+
+    @property
+    def stocked_at_mouser(self) -> bool:
+        return self.mouser_stock is not None and self.mouser_stock >= self.quantity
+
+    @property
+    def stocked_at_farnell(self) -> bool:
+        return self.farnell_stock is not None and self.farnell_stock >= self.quantity
+
+
+def iter_bom(bom: pathlib.Path) -> Iterator[BomRow]:
+    # Yields rows as they're read so lookups can start straight away
+    with open(bom, newline="") as bom_file:
+        reader = csv.reader(bom_file)
+        next(reader, None)  # Header
+        for mpn, quantity, *_ in (x for x in reader if x):
+            yield BomRow(mpn, int(quantity))
+
+
+def read_bom(bom: pathlib.Path) -> list[BomRow]:
+    return list(iter_bom(bom))
@@ -0,0 +1,206 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Offline stand-ins for the supplier APIs so lookups can be exercised without
+# API keys or network access. The catalogue maps MPN to stock quantity.
+
+
+class FakeSupplierHandler(BaseHTTPRequestHandler):
+    server: "FakeSupplierServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _accept_request(self) -> bool:
+        # Counts the request and applies the server's latency and rate limit
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.server.take_token():
+            self.server.rejected_count += 1
+            self._send_rate_limited()
+            return False
+        self.server.request_count += 1
+        return True
+
+    def _send_rate_limited(self):
+        self._send_json({"Errors": [{"Message": "Too many requests"}]}, 429)
+
+
+class FakeMouserHandler(FakeSupplierHandler):
+    def _part(self, mpn: str, stock: int) -> dict:
+        return {
+            "ManufacturerPartNumber": mpn,
+            "MouserPartNumber": f"000-{mpn}",
+            "Min": "1",
+            "AvailabilityInStock": str(stock) if stock else None,
+        }
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0]
+        if not self._accept_request():
+            return
+
+        if path.endswith("/search/partnumber"):
+            requested = request["SearchByPartRequest"]["mouserPartNumber"]
+            mpns = [x for x in requested.split("|") if x]
+            if len(mpns) > 10:
+                self._send_json(
+                    {
+                        "Errors": [{"Message": "Too many part numbers"}],
+                        "SearchResults": None,
+                    }
+                )
+                return
+            parts = [
+                self._part(x, self.server.catalogue[x])
+                for x in mpns
+                if x in self.server.catalogue
+            ]
+        elif path.endswith("/search/keyword"):
+            # Keyword searches also match anything containing the keyword
+            keyword = request["SearchByKeywordRequest"]["keyword"]
+            parts = [
+                self._part(x, stock)
+                for x, stock in self.server.catalogue.items()
+                if keyword.upper() in x.upper()
+            ]
+        else:
+            self._send_json({"Errors": [{"Message": "Not found"}]}, 404)
+            return
+
+        self._send_json(
+            {
+                "Errors": [],
+                "SearchResults": {"NumberOfResult": len(parts), "Parts": parts},
+            }
+        )
+
+
+class FakeFarnellHandler(FakeSupplierHandler):
+    def _send_rate_limited(self):
+        # Farnell rejects anything over its QPS limit with a 403
+        self._send_json({"Fault": {"faultstring": "Developer Over Qps"}}, 403)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not url.path.endswith("/catalog/products"):
+            self._send_json({"Fault": {"faultstring": "Not found"}}, 404)
+            return
+        if not self._accept_request():
+            return
+
+        term = parse_qs(url.query).get("term", [""])[0]
+        mpn = term.split(":", 1)[-1]
+        products = []
+        if mpn in self.server.catalogue:
+            products.append(
+                {
+                    "translatedManufacturerPartNumber": mpn,
+                    "translatedMinimumOrderQuality": 1,
+                    "stock": {
+                        "breakdown": [
+                            {"region": "UK", "inv": self.server.catalogue[mpn]}
+                        ]
+                    },
+                }
+            )
+        self._send_json(
+            {
+                "manufacturerPartNumberSearchReturn": {
+                    "numberOfResults": len(products),
+                    "products": products,
+                }
+            }
+        )
+
+
+class FakeSupplierServer(ThreadingHTTPServer):
+    daemon_threads = True
+    handler: type[FakeSupplierHandler]
+    path = ""
+
+    def __init__(
+        self,
+        catalogue: dict[str, int],
+        port: int = 0,
+        rate_limit: Optional[float] = None,
+        latency: float = 0,
+    ):
+        # rate_limit is requests per second, anything faster is rejected
+        # as the real API would. latency (seconds) is added to every request.
+        super().__init__(("127.0.0.1", port), self.handler)
+        self.catalogue = catalogue
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.request_count = 0
+        self.rejected_count = 0
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        # Allow a little jitter from the client's own rate limiter
+        self.tokens = 2.0
+        self.last_refill = time.monotonic()
+
+    def take_token(self) -> bool:
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                2.0, self.tokens + (now - self.last_refill) * self.rate_limit
+            )
+            self.last_refill = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{self.path}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeMouserServer(FakeSupplierServer):
+    handler = FakeMouserHandler
+    path = "/api/v2"
+
+
+class FakeFarnellServer(FakeSupplierServer):
+    handler = FakeFarnellHandler
+
+
+if __name__ == "__main__":
+    # Usage: python3 -m mousearch.fake_suppliers <catalogue.json> [port]
+    # Farnell is served on the next port up
+    with open(sys.argv[1]) as file:
+        catalogue = json.load(file)
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    mouser = FakeMouserServer(catalogue, port)
+    farnell = FakeFarnellServer(catalogue, port + 1)
+    print(f"Fake Mouser API listening on {mouser.url}")
+    print(f"Fake Farnell API listening on {farnell.url}")
+    with farnell:
+        mouser.serve_forever()
@@ -1,30 +1,107 @@
 import json
 import logging
+import os
 from typing import Optional
 import re
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
 
+from mousearch.rate_limit import RequestBudget, TokenBucket
+from mousearch.request_log import RequestLog
+from mousearch.retry import (
+    REQUEST_TIMEOUT,
+    BudgetExhausted,
+    SupplierError,
+    TransientSupplierError,
+    check_response,
+    with_retries,
+)
+from mousearch.stock_cache import StockCache
 
-class FarnellBaseRequest:
-    BASE_URL = "https://api.element14.com/catalog/products?"
 
-    def __init__(self, api_key: str):
+class FarnellBaseRequest:
+    BASE_URL = "https://api.element14.com"
+
+    def __init__(
+        self,
+        api_key: str,
+        session: Optional[requests.Session] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        request_log: Optional[RequestLog] = None,
+        base_url: Optional[str] = None,
+        request_budget: Optional[RequestBudget] = None,
+    ):
         self.api_key = api_key
+        self.session = session if session else requests.Session()
+        self.rate_limiter = rate_limiter
+        self.request_log = request_log
+        # FARNELL_API_URL points every lookup at another server, e.g. a fake
+        self.base_url = base_url or os.environ.get("FARNELL_API_URL", self.BASE_URL)
+        self.request_budget = request_budget
 
     def get(self, options: dict[str:str]) -> requests.Response:
-        url = self.BASE_URL
+        url = f"{self.base_url}/catalog/products?"
         for option, value in options.items():
             url += f"{option}={value}&"
         url += f"callinfo.apikey={self.api_key}"
-
-        return requests.get(url)
+        if self.request_budget is not None and not self.request_budget.take():
+            raise BudgetExhausted("Farnell request budget used up")
+
+        wait_start_time = time.perf_counter()
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        start_time = time.perf_counter()
+        status = None
+        try:
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT)
+            status = response.status_code
+        except requests.RequestException as e:
+            raise TransientSupplierError(f"Farnell request failed: {e}")
+        finally:
+            if self.request_log:
+                self.request_log.record(
+                    "farnell",
+                    "catalog/products",
+                    time.perf_counter() - start_time,
+                    start_time - wait_start_time,
+                    status,
+                )
+        if response.status_code == 403 and "Over Qps" in response.text:
+            # Farnell's rate limit
+            raise TransientSupplierError("Farnell rate limited request")
+        check_response(response, "Farnell product search")
+        return response
 
 
 class FarnellAPI:
-    def __init__(self, api_key: str, logger: Optional[logging.Logger] = None):
+    # Farnell allows 2 requests per second
+    REQUESTS_PER_SECOND = 2
+
+    def __init__(
+        self,
+        api_key: str,
+        logger: Optional[logging.Logger] = None,
+        max_connections: int = 4,
+        cache: Optional[StockCache] = None,
+        request_log: Optional[RequestLog] = None,
+        base_url: Optional[str] = None,
+        request_budget: Optional[RequestBudget] = None,
+    ):
 
         self.api_key = api_key
+        self.cache = cache
+        self.request_log = request_log
+        self.base_url = base_url
+        # Most requests to send, None for no limit
+        self.request_budget = request_budget
+        # Reuse connections between requests rather than a new one per part
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.rate_limiter = TokenBucket(self.REQUESTS_PER_SECOND)
         if logger:
             self.logger = logger
         else:
@@ -35,41 +112,61 @@ class FarnellAPI:
             self.logger.addHandler(logger_handler)
 
     def check_for_stock(self, part_number: str) -> int:
+        if self.cache:
+            quantity = self.cache.get("farnell", part_number)
+            if quantity is not None:
+                self.logger.debug(f"Using cached stock for {part_number}")
+                return quantity
+
+        quantity = with_retries(self._query_stock, part_number, logger=self.logger)
+        if self.cache:
+            self.cache.put("farnell", part_number, quantity)
+        return quantity
+
+    def _query_stock(self, part_number: str) -> int:
+        self.logger.debug(f"Checking stock for {part_number}")
+        x = FarnellBaseRequest(
+            self.api_key,
+            self.session,
+            self.rate_limiter,
+            self.request_log,
+            self.base_url,
+            self.request_budget,
+        )
+        https_options = {
+            "versionNumber": 1.3,
+            "term": f"manuPartNum:{re.sub('#', '%23', part_number)}",
+            "storeInfo.id": "uk.farnell.com",
+            "resultsSettings.offset": 0,
+            "resultsSettings.numberOfResults": 10,
+            "resultsSettings.responseGroup": "inventory",
+            "callInfo.omitXmlSchema": False,
+            "callInfo.responseDataFormat": "json",
+        }
+
+        response = x.get(options=https_options)
         try:
-            self.logger.debug(f"Checking stock for {part_number}")
-            part_number = re.sub("#", "%23", part_number)
-            x = FarnellBaseRequest(self.api_key)
-            https_options = {
-                "versionNumber": 1.3,
-                "term": f"manuPartNum:{part_number}",
-                "storeInfo.id": "uk.farnell.com",
-                "resultsSettings.offset": 0,
-                "resultsSettings.numberOfResults": 10,
-                "resultsSettings.responseGroup": "inventory",
-                "callInfo.omitXmlSchema": False,
-                "callInfo.responseDataFormat": "json",
-            }
-
-            response = x.get(options=https_options)
-            result = response.json()["manufacturerPartNumberSearchReturn"]
-
-            num_results = int(result["numberOfResults"])
-
-            if num_results == 0:
-                return -1  # MPN not found
-
-            for product in result["products"]:
-                if int(product["translatedMinimumOrderQuality"]) <= 10:
-                    try:
-                        for x in product["stock"]["breakdown"]:
-                            if x["region"] == "UK" and int(x["inv"]):
-                                return int(x["inv"])
-                    except KeyError:
-                        continue
-
-            return 0  # Didn't find suitable stock
-        except:
-            raise Exception(part_number)
+            return self._stock_from_response(response.json())
+        except (ValueError, KeyError, TypeError):
+            raise SupplierError(f"Unexpected Farnell response for {part_number}")
+
+    def _stock_from_response(self, response: dict) -> int:
+        result = response["manufacturerPartNumberSearchReturn"]
+        num_results = int(result["numberOfResults"])
+
+        if num_results == 0:
+            return -1  # MPN not found
+
+        for product in result["products"]:
+            if int(product["translatedMinimumOrderQuality"]) <= 10:
+                try:
+                    for x in product["stock"]["breakdown"]:
+                        if x["region"] == "UK" and int(x["inv"]):
+                            return int(x["inv"])
+                except KeyError:
+                    continue
+
+        return 0  # Didn't find suitable stock
 
 
 if __name__ == "__main__":
@@ -1,31 +1,100 @@
+import argparse
 import pathlib
-import re
-from datetime import datetime
-from time import sleep
-import pathlib
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 from tqdm import tqdm
-import sys
 import subprocess
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Tuple
 
 
+from mousearch.bom import BomRow, PartResult
 from mousearch.mouser_api import MouserAPI
+from mousearch.planner import QUICK_RELEASE_REQUESTS, QueryPlan, plan_queries
 from mousearch.farnell_api import FarnellAPI
+from mousearch.report import ReportWriter
+from mousearch.rate_limit import RequestBudget
+from mousearch.request_log import RequestLog
+from mousearch.retry import BudgetExhausted, SupplierError
+from mousearch.schematic import iter_bom_rows
+from mousearch.stock_cache import StockCache
+
+# (MPN, Mouser stock, Farnell stock), stock is None if the lookup failed
+PartStock = Tuple[str, Optional[int], Optional[int]]
+
 
-MOUSER_BIT = 1 << 1
-FARNELL_BIT = 1 << 0
+class BomReport:
+    def __init__(
+        self,
+        bom: pathlib.Path,
+        output_file: pathlib.Path,
+        mouser_basket: pathlib.Path,
+        farnell_basket: pathlib.Path,
+        journal_file: Optional[pathlib.Path] = None,
+    ):
+        self.bom = bom
+        self.output_file = output_file
+        self.mouser_basket = mouser_basket
+        self.farnell_basket = farnell_basket
+        # Beside output_file unless given, see ReportWriter
+        self.journal_file = journal_file
 
 
 class Mousearch:
-    def __init__(self, mouser_key: str, farnell_key: str):
+    def __init__(
+        self,
+        mouser_key: str,
+        farnell_key: str,
+        workers_per_supplier: int = 2,
+        cache_path: Optional[pathlib.Path] = None,
+        cache_ttl: float = 24 * 60 * 60,
+        refresh_cache: bool = False,
+        mouser_url: Optional[str] = None,
+        farnell_url: Optional[str] = None,
+        mouser_budget: Optional[int] = None,
+        farnell_budget: Optional[int] = None,
+    ):
         self.mouser_key = mouser_key
         self.farnell_key = farnell_key
+        self.workers_per_supplier = workers_per_supplier
+        # The cache is opened when needed as this object may be sent
+        # to another process
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.refresh_cache = refresh_cache
+        self.mouser_url = mouser_url
+        self.farnell_url = farnell_url
+        # Most requests each supplier is sent per run, None for no limit
+        self.mouser_budget = mouser_budget
+        self.farnell_budget = farnell_budget
+        self.request_log: Optional[RequestLog] = None
+
+    def open_cache(self) -> Optional[StockCache]:
+        if self.cache_path is None:
+            return None
+        return StockCache(
+            self.cache_path, ttl=self.cache_ttl, refresh=self.refresh_cache
+        )
+
+    def request_budgets(
+        self, full_release: bool = True
+    ) -> Optional[dict[str, Optional[int]]]:
+        # None if every part can be looked up. Quick releases spend a few
+        # requests per supplier on the riskiest parts unless told otherwise.
+        budgets = {"mouser": self.mouser_budget, "farnell": self.farnell_budget}
+        if not full_release:
+            budgets = {
+                x: QUICK_RELEASE_REQUESTS if y is None else y
+                for x, y in budgets.items()
+            }
+        if all(x is None for x in budgets.values()):
+            return None
+        return budgets
 
     def generate_bom(
         self, top_level_schematic: pathlib.Path, output_file: pathlib.Path = "bom.csv"
     ):
         output_file.parent.mkdir(parents=True, exist_ok=True)
-        
+
         commands = [
             "kicad-cli",
             "sch",
@@ -43,106 +112,241 @@ class Mousearch:
         subprocess.check_output(commands)
         self.bom = output_file
 
+    def iter_stock(
+        self, mpns: Iterable[str], plan: Optional[QueryPlan] = None
+    ) -> Iterator[PartStock]:
+        # Yields (MPN, Mouser stock, Farnell stock) for each unique MPN as
+        # soon as both suppliers have answered. MPNs are submitted for lookup
+        # as they're read from mpns so a BOM can be streamed straight in.
+        # Stock the plan already knows is used instead of asking for it, and
+        # no supplier is sent more requests than the plan's budget.
+        cache = self.open_cache()
+        # Created here as the lock can't be pickled to worker processes
+        self.request_log = RequestLog()
+        budgets = {
+            x: RequestBudget(y)
+            for x, y in (plan.budgets if plan else {}).items()
+            if y is not None
+        }
+        mouser_api = MouserAPI(
+            self.mouser_key,
+            max_connections=self.workers_per_supplier,
+            cache=cache,
+            base_url=self.mouser_url,
+            request_log=self.request_log,
+            request_budget=budgets.get("mouser"),
+        )
+        farnell_api = FarnellAPI(
+            self.farnell_key,
+            max_connections=self.workers_per_supplier,
+            cache=cache,
+            request_log=self.request_log,
+            base_url=self.farnell_url,
+            request_budget=budgets.get("farnell"),
+        )
+
+        # Query both suppliers at once, each API enforces its own rate limit
+        try:
+            with (
+                ThreadPoolExecutor(self.workers_per_supplier) as mouser_pool,
+                ThreadPoolExecutor(self.workers_per_supplier) as farnell_pool,
+            ):
+                mouser_stock: dict[str, int] = {}
+                farnell_stock: dict[str, int] = {}
+                mouser_batches: dict[Future, list[str]] = {}
+                farnell_futures: dict[Future, str] = {}
+                batch: list[str] = []
+                seen: set[str] = set()
+                # Parts with nothing left to look up
+                ready: list[str] = []
+                for mpn in mpns:
+                    if mpn in seen:
+                        continue
+                    seen.add(mpn)
+                    if plan and mpn in plan.known["farnell"]:
+                        farnell_stock[mpn] = plan.known["farnell"][mpn]
+                    else:
+                        farnell_futures[
+                            farnell_pool.submit(farnell_api.check_for_stock, mpn)
+                        ] = mpn
+                    if plan and mpn in plan.known["mouser"]:
+                        mouser_stock[mpn] = plan.known["mouser"][mpn]
+                        if mpn in farnell_stock:
+                            ready.append(mpn)
+                        continue
+                    # Mouser can look up several exact part numbers per request
+                    batch.append(mpn)
+                    if len(batch) == MouserAPI.BATCH_SIZE:
+                        mouser_batches[
+                            mouser_pool.submit(mouser_api.check_for_stock_batch, batch)
+                        ] = batch
+                        batch = []
+                if batch:
+                    mouser_batches[
+                        mouser_pool.submit(mouser_api.check_for_stock_batch, batch)
+                    ] = batch
+
+                for mpn in ready:
+                    yield mpn, mouser_stock[mpn], farnell_stock[mpn]
+                for future in tqdm(
+                    as_completed([*mouser_batches, *farnell_futures]),
+                    total=len(mouser_batches) + len(farnell_futures),
+                ):
+                    if future in farnell_futures:
+                        mpn = farnell_futures[future]
+                        farnell_stock[mpn] = self._stock_or_failure(future, mpn, plan)
+                        if mpn in mouser_stock:
+                            yield mpn, mouser_stock[mpn], farnell_stock[mpn]
+                    else:
+                        batch = mouser_batches[future]
+                        try:
+                            quantities = future.result()
+                        except SupplierError as e:
+                            print(f"Mouser lookup failed: {e}")
+                            quantities = {
+                                mpn: self._failed_stock(plan, "mouser", mpn, e)
+                                for mpn in batch
+                            }
+                        for mpn, quantity in quantities.items():
+                            mouser_stock[mpn] = quantity
+                            if mpn in farnell_stock:
+                                yield mpn, quantity, farnell_stock[mpn]
+        finally:
+            if cache:
+                cache.close()
+
+    def _stock_or_failure(
+        self, future: Future, mpn: str, plan: Optional[QueryPlan]
+    ) -> Optional[int]:
+        try:
+            return future.result()
+        except SupplierError as e:
+            print(f"Farnell lookup failed: {e}")
+            return self._failed_stock(plan, "farnell", mpn, e)
+
+    def _failed_stock(
+        self,
+        plan: Optional[QueryPlan],
+        supplier: str,
+        mpn: str,
+        error: SupplierError,
+    ) -> Optional[int]:
+        # Hard failures are recorded against the part rather than stopping
+        # every other lookup, the part is checked again on the next run.
+        # If retries used up the budget, the part's last check is carried
+        # over as though it had been planned that way.
+        if plan and isinstance(error, BudgetExhausted):
+            return plan.carry_over(supplier, mpn)
+        return None
+
     def query_suppliers(
         self,
         output_file: pathlib.Path,
         mouser_basket: pathlib.Path,
         farnell_basket: pathlib.Path,
-        full_release: bool = True
+        full_release: bool = True,
+        bom: Optional[pathlib.Path] = None,
     ):
+        if bom is None:
+            bom = self.bom
 
-        mouser_api = MouserAPI(self.mouser_key)
-        farnell_api = FarnellAPI(self.farnell_key)
-
-        found_parts = {}
-
-        with open(self.bom) as bom_file:
-            parts_to_check = bom_file.readlines()[1:]
-            if not full_release:
-                # Only check as few parts as this takes ages
-                parts_to_check = parts_to_check[:5]
-
-            for line in tqdm(parts_to_check):
-                mpn, quantity = line.split('","')
-                mpn = re.sub('"', "", mpn)
-                quantity = int(re.sub('"', "", quantity))
-
-                start_time = datetime.now()
-                score = 0  # Use score to sort results easily
-                # Check Mouser
-                if mouser_api.check_for_stock(mpn) >= quantity:
-                    score += MOUSER_BIT
-
-                # Check Farnell
-                if farnell_api.check_for_stock(mpn) >= quantity:
-                    score += FARNELL_BIT
-
-                found_parts[mpn] = {
-                    "score": score,
-                    "stockedAtMouser": bool(score & MOUSER_BIT),
-                    "stockedAtFarnell": bool(score & FARNELL_BIT),
-                    "quantityNeeded": quantity,
-                }
-                while (datetime.now() - start_time).seconds < 2:
-                    sleep(0.1)
-
-        # Print report in sorted order
-        with (
-            open(output_file, "w") as bom_report,
-            open(mouser_basket, "w") as mouser_csv,
-            open(farnell_basket, "w") as farnell_csv,
-        ):
-
-            issues_found_str = ""
-            num_parts_from_mouser = 0
-            num_parts_from_farnell = 0
-            num_unavailable_parts = 0
-            for mpn, status in sorted(
-                found_parts.items(), key=lambda item: (item[1]["score"], item[0])
-            ):
-                # Order from first supplier that has stock
-                quantity = status["quantityNeeded"]
-                if status["stockedAtMouser"]:
-                    mouser_csv.write(f"{mpn},{quantity}\n")
-                    num_parts_from_mouser += 1
-                elif status["stockedAtFarnell"]:
-                    farnell_csv.write(f"{mpn},{quantity}\n")
-                    num_parts_from_farnell += 1
-                else:
-                    num_unavailable_parts += 1
-
-                # Highlight potential issues for any part that is not
-                # in stock by every supplier
-                if status["score"] < (MOUSER_BIT | FARNELL_BIT):
-                    if issues_found_str == "":
-                        # Put header in
-                        issues_found_str = "### Issues\rPossible supply issues were found with the following items:\r\r"
-                        issues_found_str += "| MPN | Mouser | Farnell |\r"
-                        issues_found_str += "| --- | --- | --- |\r"
-
-                    issues_found_str += f"| {mpn} "
-                    if status["stockedAtMouser"]:
-                        issues_found_str += "| ✅ "
-                    else:
-                        issues_found_str += "| ❌ "
+        # Rows are looked up while the rest of the BOM is still being read
+        report = BomReport(bom, output_file, mouser_basket, farnell_basket)
+        self.check_reports(
+            [(report, iter_bom_rows(bom))], self.request_budgets(full_release)
+        )
 
-                    if status["stockedAtFarnell"]:
-                        issues_found_str += "| ✅ "
-                    else:
-                        issues_found_str += "| ❌ "
+    def query_suppliers_for_projects(
+        self,
+        reports: list[BomReport],
+        full_release: bool = True,
+        boms: Optional[list[list[BomRow]]] = None,
+    ):
+        # Each MPN is only looked up once however many boards use it. boms
+        # are each report's rows if they've already been read, e.g. by the
+        # shards of a release
+        if boms is None:
+            boms = [list(iter_bom_rows(x.bom)) for x in reports]
+        print(
+            f"Checking {len({y.mpn for x in boms for y in x})} unique parts "
+            f"across {len(reports)} projects"
+        )
+        self.check_reports(list(zip(reports, boms)), self.request_budgets(full_release))
+        return self.request_log.as_dict() if self.request_log else None
 
-                    issues_found_str += "|\r"
+    def check_reports(
+        self,
+        boms: list[Tuple[BomReport, Iterable[BomRow]]],
+        budgets: Optional[dict[str, Optional[int]]] = None,
+    ):
+        # Reports are written as each part's lookups finish, parts found in
+        # the journal of an interrupted run aren't looked up again. With
+        # budgets only the riskiest parts are looked up, see plan_queries.
+        with ExitStack() as stack:
+            writers = [
+                stack.enter_context(
+                    ReportWriter(
+                        x.output_file,
+                        x.mouser_basket,
+                        x.farnell_basket,
+                        max_age=self.cache_ttl,
+                        # Refreshing looks every part up again
+                        resume=not self.refresh_cache,
+                        journal_file=x.journal_file,
+                    )
+                )
+                for x, _ in boms
+            ]
+            # Which reports need each MPN and how many of it
+            needed: dict[str, list[Tuple[ReportWriter, int]]] = {}
+
+            def mpns_needed() -> Iterator[str]:
+                for writer, (_, rows) in zip(writers, boms):
+                    for row in rows:
+                        if row.mpn in writer.resumed:
+                            writer.add(
+                                PartResult(
+                                    row.mpn, row.quantity, *writer.resumed[row.mpn]
+                                )
+                            )
+                            continue
+                        needed.setdefault(row.mpn, []).append((writer, row.quantity))
+                        yield row.mpn
 
-            # Have finished going through parts
-            if issues_found_str == "":
-                issues_found_str = "### Issues\rNo supply issues found\r"
+            mpns: Iterable[str] = mpns_needed()
+            plan = None
+            if budgets is not None:
+                # Planning needs the whole BOM before anything is looked up
+                mpns = list(mpns)
+                cache = self.open_cache()
+                try:
+                    plan = plan_queries(
+                        {x: max(q for _, q in y) for x, y in needed.items()},
+                        budgets,
+                        cache,
+                    )
+                finally:
+                    if cache:
+                        cache.close()
 
-            sourcing_table = f"### Supply breakdown\r"
-            sourcing_table += "| Source | Mouser | Farnell | Unavailable |\r"
-            sourcing_table += "| --- | --- | --- | --- |\r"
-            sourcing_table += f"| Components | {num_parts_from_mouser} | {num_parts_from_farnell} | {num_unavailable_parts} |\r\r\r"
+            # iter_stock reads every MPN before yielding so needed is complete
+            for mpn, mouser_stock, farnell_stock in self.iter_stock(mpns, plan):
+                for writer, quantity in needed[mpn]:
+                    writer.add(
+                        PartResult(
+                            mpn,
+                            quantity,
+                            mouser_stock,
+                            farnell_stock,
+                            mouser_carried=plan is not None
+                            and plan.is_carried("mouser", mpn),
+                            farnell_carried=plan is not None
+                            and plan.is_carried("farnell", mpn),
+                        )
+                    )
 
-            bom_report.write(sourcing_table + issues_found_str)
+            for x in writers:
+                x.finish()
 
     def run(
         self,
@@ -151,27 +355,101 @@ class Mousearch:
         mouser_basket: pathlib.Path,
         farnell_basket: pathlib.Path,
         csv_location: Optional[pathlib.Path] = None,
-        full_release: bool = True
+        full_release: bool = True,
+        schematic_bom: bool = False,
     ):
-        if csv_location is None:
-           csv_location = pathlib.Path() / ".." / f"tmp-{top_level_schematic.stem}" / "bom.csv"
-        self.generate_bom(
-            top_level_schematic=top_level_schematic, output_file=csv_location
-        )
+        # kicad-cli exports the BOM unless the schematic is to be read
+        # directly, which is faster and doesn't need KiCad installed
+        self.bom = top_level_schematic
+        if not schematic_bom:
+            if csv_location is None:
+                csv_location = (
+                    pathlib.Path()
+                    / ".."
+                    / f"tmp-{top_level_schematic.stem}"
+                    / "bom.csv"
+                )
+            self.generate_bom(
+                top_level_schematic=top_level_schematic, output_file=csv_location
+            )
         self.query_suppliers(
             output_file=output_file,
             mouser_basket=mouser_basket,
             farnell_basket=farnell_basket,
-            full_release=full_release
+            full_release=full_release,
         )
 
 
 if __name__ == "__main__":
-    input_dir = pathlib.Path(sys.argv[1])
-    found_projects = list(input_dir.rglob("*.kicad_pro"))
+    parser = argparse.ArgumentParser(
+        description="Check supplier stock for a KiCad project's BOM"
+    )
+    parser.add_argument("input_dir", type=pathlib.Path)
+    parser.add_argument("mouser_key")
+    parser.add_argument("farnell_key")
+    parser.add_argument("output_file", type=pathlib.Path)
+    parser.add_argument(
+        "--mouser-basket", type=pathlib.Path, default=pathlib.Path("mouser-bom.csv")
+    )
+    parser.add_argument(
+        "--farnell-basket",
+        type=pathlib.Path,
+        default=pathlib.Path("farnell-bom.csv"),
+    )
+    parser.add_argument(
+        "--cache",
+        type=pathlib.Path,
+        default=None,
+        help="SQLite file to cache stock lookups in",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=24,
+        help="Hours before a cached stock lookup is checked again (default: 24)",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached stock lookups, the cache is still updated",
+    )
+    parser.add_argument(
+        "--schematic-bom",
+        action="store_true",
+        help="Read the BOM straight from the schematic rather than with kicad-cli",
+    )
+    parser.add_argument(
+        "--mouser-budget",
+        type=int,
+        default=None,
+        help="Most requests to send Mouser, riskiest parts are checked first",
+    )
+    parser.add_argument(
+        "--farnell-budget",
+        type=int,
+        default=None,
+        help="Most requests to send Farnell, riskiest parts are checked first",
+    )
+    args = parser.parse_args()
+
+    found_projects = list(args.input_dir.rglob("*.kicad_pro"))
     assert len(found_projects) == 1, f"Multiple projects found: {found_projects}"
     top_level_schematic = found_projects[0].with_suffix(".kicad_sch")
     print(f"Generating BOM for {top_level_schematic}")
 
-    x = Mousearch(mouser_key=sys.argv[2], farnell_key=sys.argv[3])
-    x.run(top_level_schematic=top_level_schematic, output_file=sys.argv[4])
\ No newline at end of file
+    x = Mousearch(
+        mouser_key=args.mouser_key,
+        farnell_key=args.farnell_key,
+        cache_path=args.cache,
+        cache_ttl=args.cache_ttl * 60 * 60,
+        refresh_cache=args.refresh,
+        mouser_budget=args.mouser_budget,
+        farnell_budget=args.farnell_budget,
+    )
+    x.run(
+        top_level_schematic=top_level_schematic,
+        output_file=args.output_file,
+        mouser_basket=args.mouser_basket,
+        farnell_basket=args.farnell_basket,
+        schematic_bom=args.schematic_bom,
+    )
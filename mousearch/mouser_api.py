@@ -1,32 +1,109 @@
 import json
 import logging
+import os
+import time
 from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from mousearch.rate_limit import RequestBudget, TokenBucket
+from mousearch.request_log import RequestLog
+from mousearch.retry import (
+    REQUEST_TIMEOUT,
+    BudgetExhausted,
+    SupplierError,
+    TransientSupplierError,
+    check_response,
+    with_retries,
+)
+from mousearch.stock_cache import StockCache
 
 
 class MouserBaseRequest:
     VERSION = "2"
     BASE_URL = f"https://api.mouser.com/api/v{VERSION}"
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        session: Optional[requests.Session] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        base_url: Optional[str] = None,
+        request_log: Optional[RequestLog] = None,
+        request_budget: Optional[RequestBudget] = None,
+    ):
         self.api_key = api_key
+        self.session = session if session else requests.Session()
+        self.rate_limiter = rate_limiter
+        # MOUSER_API_URL points every lookup at another server, e.g. a fake
+        self.base_url = base_url or os.environ.get("MOUSER_API_URL", self.BASE_URL)
+        self.request_log = request_log
+        self.request_budget = request_budget
 
     def post(self, url, data) -> requests.Response:
         post_headers = {
             "Content-Type": "application/json",
         }
-        return requests.post(
-            url=f"{self.BASE_URL}/{url}?apiKey={self.api_key}",
-            data=json.dumps(data),
-            headers=post_headers,
-        )
+        if self.request_budget is not None and not self.request_budget.take():
+            raise BudgetExhausted(f"Mouser request budget used up before {url}")
+        wait_start_time = time.perf_counter()
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        start_time = time.perf_counter()
+        status = None
+        try:
+            response = self.session.post(
+                url=f"{self.base_url}/{url}?apiKey={self.api_key}",
+                data=json.dumps(data),
+                headers=post_headers,
+                timeout=REQUEST_TIMEOUT,
+            )
+            status = response.status_code
+        except requests.RequestException as e:
+            raise TransientSupplierError(f"Mouser {url} request failed: {e}")
+        finally:
+            if self.request_log:
+                self.request_log.record(
+                    "mouser",
+                    url,
+                    time.perf_counter() - start_time,
+                    start_time - wait_start_time,
+                    status,
+                )
+        check_response(response, f"Mouser {url}")
+        return response
 
 
 class MouserAPI:
-    def __init__(self, api_key: str, logger: Optional[logging.Logger] = None):
+    # Mouser allows 30 requests per minute
+    REQUESTS_PER_SECOND = 0.5
+    # Maximum number of part numbers in one part number search
+    BATCH_SIZE = 10
+
+    def __init__(
+        self,
+        api_key: str,
+        logger: Optional[logging.Logger] = None,
+        max_connections: int = 4,
+        cache: Optional[StockCache] = None,
+        base_url: Optional[str] = None,
+        request_log: Optional[RequestLog] = None,
+        request_budget: Optional[RequestBudget] = None,
+    ):
 
         self.api_key = api_key
+        self.cache = cache
+        self.base_url = base_url
+        self.request_log = request_log
+        # Most requests to send, None for no limit
+        self.request_budget = request_budget
+        # Reuse connections between requests rather than a new one per part
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.rate_limiter = TokenBucket(self.REQUESTS_PER_SECOND)
         if logger:
             self.logger = logger
         else:
@@ -39,42 +116,150 @@ class MouserAPI:
     def search_by_keyword(self, keyword) -> dict:
 
         self.logger.debug(f"Searching for {keyword}")
-        x = MouserBaseRequest(self.api_key)
-        result = x.post(
-            url="search/keyword",
-            data={
-                "SearchByKeywordRequest": {
-                    "keyword": f"{keyword}",
-                }
-            },
-        ).json()
-
-        errors = result["Errors"]
-
-        assert not errors, f"Query for {keyword} return errors: {errors}"
+        x = MouserBaseRequest(
+            self.api_key,
+            self.session,
+            self.rate_limiter,
+            self.base_url,
+            self.request_log,
+            self.request_budget,
+        )
+        result = self._read_response(
+            x.post(
+                url="search/keyword",
+                data={
+                    "SearchByKeywordRequest": {
+                        "keyword": f"{keyword}",
+                    }
+                },
+            ),
+            keyword,
+        )
         return result["SearchResults"]
 
+    def _read_response(self, response: requests.Response, query: str) -> dict:
+        try:
+            result = response.json()
+            errors = result["Errors"]
+        except (ValueError, KeyError, TypeError):
+            raise SupplierError(f"Unexpected Mouser response for {query}")
+        if errors:
+            messages = " ".join(str(x.get("Message", x)) for x in errors)
+            if "too many" in messages.lower():
+                # Over the daily or per minute request limit
+                raise TransientSupplierError(
+                    f"Mouser rate limited query for {query}: {messages}"
+                )
+            raise SupplierError(f"Query for {query} return errors: {messages}")
+        return result
+
     def check_for_stock(self, part_number: str) -> int:
-        self.logger.debug(f"Checking stock for {part_number}")
-        x = MouserBaseRequest(self.api_key)
-        result = x.post(
-            url="search/keyword",
-            data={"SearchByKeywordRequest": {"keyword": f"{part_number}"}},
-        ).json()
+        if self.cache:
+            quantity = self.cache.get("mouser", part_number)
+            if quantity is not None:
+                self.logger.debug(f"Using cached stock for {part_number}")
+                return quantity
 
-        errors = result["Errors"]
+        quantity = with_retries(self._query_stock, part_number, logger=self.logger)
+        if self.cache:
+            self.cache.put("mouser", part_number, quantity)
+        return quantity
+
+    def _query_stock(self, part_number: str) -> int:
+        self.logger.debug(f"Checking stock for {part_number}")
+        x = MouserBaseRequest(
+            self.api_key,
+            self.session,
+            self.rate_limiter,
+            self.base_url,
+            self.request_log,
+            self.request_budget,
+        )
+        result = self._read_response(
+            x.post(
+                url="search/keyword",
+                data={"SearchByKeywordRequest": {"keyword": f"{part_number}"}},
+            ),
+            part_number,
+        )
+        try:
+            return self._stock_from_parts(result["SearchResults"]["Parts"])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise SupplierError(f"Unexpected Mouser response for {part_number}")
 
-        assert not errors, f"Query for {part_number} return errors: {errors}"
+    def _stock_from_parts(self, parts: list[dict]) -> int:
         # Remove any options for volume ordering and extra long part numbers
-        parts = [x for x in result["SearchResults"]["Parts"]]
         if len(parts) == 0:
             return -1
         for x in [y for y in parts if y["Min"] == "1"]:
-            in_stock_quantity = int(x["AvailabilityInStock"])
+            in_stock_quantity = int(x["AvailabilityInStock"] or 0)
             if in_stock_quantity:
                 return in_stock_quantity
         return 0
 
+    def check_for_stock_batch(self, part_numbers: list[str]) -> dict[str, int]:
+        results = {}
+        to_query = []
+        for part_number in part_numbers:
+            quantity = self.cache.get("mouser", part_number) if self.cache else None
+            if quantity is None:
+                to_query.append(part_number)
+            else:
+                self.logger.debug(f"Using cached stock for {part_number}")
+                results[part_number] = quantity
+
+        for i in range(0, len(to_query), self.BATCH_SIZE):
+            chunk = to_query[i : i + self.BATCH_SIZE]
+            for part_number, quantity in with_retries(
+                self._query_stock_batch, chunk, logger=self.logger
+            ).items():
+                if self.cache:
+                    self.cache.put("mouser", part_number, quantity)
+                results[part_number] = quantity
+        return results
+
+    def _query_stock_batch(self, part_numbers: list[str]) -> dict[str, int]:
+        self.logger.debug(f"Checking stock for {', '.join(part_numbers)}")
+        x = MouserBaseRequest(
+            self.api_key,
+            self.session,
+            self.rate_limiter,
+            self.base_url,
+            self.request_log,
+            self.request_budget,
+        )
+        result = self._read_response(
+            x.post(
+                url="search/partnumber",
+                data={
+                    "SearchByPartRequest": {
+                        "mouserPartNumber": "|".join(part_numbers),
+                        "partSearchOptions": "Exact",
+                    }
+                },
+            ),
+            ", ".join(part_numbers),
+        )
+        try:
+            return self._stock_from_batch(result, part_numbers)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise SupplierError(
+                f"Unexpected Mouser response for {', '.join(part_numbers)}"
+            )
+
+    def _stock_from_batch(
+        self, result: dict, part_numbers: list[str]
+    ) -> dict[str, int]:
+        # Exact searches can also match Mouser's own part numbers
+        # so group results by the MPN that was asked for
+        matches = {x.upper(): [] for x in part_numbers}
+        for part in result["SearchResults"]["Parts"]:
+            mpn = part["ManufacturerPartNumber"].upper()
+            if mpn in matches:
+                matches[mpn].append(part)
+
+        return {x: self._stock_from_parts(matches[x.upper()]) for x in part_numbers}
+
 
 if __name__ == "__main__":
     logger = logging.getLogger("Mousearch Debug")
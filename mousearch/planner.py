@@ -0,0 +1,112 @@
+import math
+import time
+from typing import Optional, Tuple
+
+from mousearch.mouser_api import MouserAPI
+from mousearch.stock_cache import StockCache
+
+# MPNs each supplier can be asked about per request
+BATCH_SIZES = {"mouser": MouserAPI.BATCH_SIZE, "farnell": 1}
+# Requests each supplier is sent by a quick release
+QUICK_RELEASE_REQUESTS = 5
+# Parts last seen with at least this many times the stock needed...
+COMFORTABLE_MARGIN = 10
+# ...within this many seconds are looked up last when on a budget
+RECENT = 7 * 24 * 60 * 60
+
+
+def part_risk(
+    last_seen: Optional[Tuple[int, float]],
+    quantity: int,
+    now: float,
+    recent: float = RECENT,
+) -> Tuple[int, float, float]:
+    # Sort key for which parts to look up first
+    if last_seen is None:
+        # Never seen
+        return (0, 0, 0)
+    stock, checked = last_seen
+    if stock < quantity:
+        # Out of stock, too few or unknown to the supplier (-1)
+        return (1, 0, checked)
+    margin = stock / max(quantity, 1)
+    if margin >= COMFORTABLE_MARGIN and now - checked <= recent:
+        # Only looked up with requests to spare, the oldest check first
+        return (3, checked, margin)
+    # Closest to running out first, then the oldest check
+    return (2, margin, checked)
+
+
+class QueryPlan:
+    # Which parts each supplier is asked about when there's a request
+    # budget, and the stock used for everything else
+    def __init__(self, budgets: dict[str, Optional[int]]):
+        # Most requests each supplier may be sent, None for no limit
+        self.budgets = budgets
+        self.queried: dict[str, list[str]] = {x: [] for x in BATCH_SIZES}
+        # Stock of parts that won't be looked up, None if never seen
+        self.known: dict[str, dict[str, Optional[int]]] = {x: {} for x in BATCH_SIZES}
+        # Stock each part missing from the cache was last seen with, None if
+        # never seen
+        self.last_seen: dict[str, dict[str, Optional[int]]] = {
+            x: {} for x in BATCH_SIZES
+        }
+        # Parts whose stock is from an earlier check rather than the cache
+        # or a lookup this run
+        self.carried: dict[str, set[str]] = {x: set() for x in BATCH_SIZES}
+
+    def carry_over(self, supplier: str, mpn: str) -> Optional[int]:
+        # Stock for a part the budget doesn't stretch to, None if never seen
+        stock = self.last_seen[supplier].get(mpn)
+        if stock is not None:
+            self.carried[supplier].add(mpn)
+        return stock
+
+    def is_carried(self, supplier: str, mpn: str) -> bool:
+        return mpn in self.carried[supplier]
+
+
+def plan_queries(
+    needed: dict[str, int],
+    budgets: dict[str, Optional[int]],
+    cache: Optional[StockCache] = None,
+    recent: float = RECENT,
+) -> QueryPlan:
+    # needed is the most of each MPN any report needs, budgets the most
+    # requests each supplier may be sent (None for no limit). Parts are
+    # looked up riskiest first: never seen, last seen without enough stock,
+    # the least stock compared to what's needed and lastly parts recently
+    # seen with plenty. Only parts past the budget are carried over.
+    now = time.time()
+    plan = QueryPlan(budgets)
+    for supplier, batch_size in BATCH_SIZES.items():
+        candidates = []
+        for mpn, quantity in needed.items():
+            cached = cache.get(supplier, mpn) if cache else None
+            if cached is not None:
+                # Answered by the cache without a request
+                plan.known[supplier][mpn] = cached
+                continue
+            last_seen = cache.last_seen(supplier, mpn) if cache else None
+            plan.last_seen[supplier][mpn] = last_seen[0] if last_seen else None
+            candidates.append((part_risk(last_seen, quantity, now, recent), mpn))
+
+        budget = budgets.get(supplier)
+        limit = len(candidates) if budget is None else budget * batch_size
+        candidates.sort()
+        for _, mpn in candidates[limit:]:
+            # Over budget, the last check is better than nothing
+            plan.known[supplier][mpn] = plan.carry_over(supplier, mpn)
+        plan.queried[supplier] = [x[1] for x in candidates[:limit]]
+
+        unchecked = sum(
+            1 for _, x in candidates[limit:] if plan.known[supplier][x] is None
+        )
+        print(
+            f"{supplier.capitalize()}: checking {len(plan.queried[supplier])} "
+            f"parts in "
+            f"{math.ceil(len(plan.queried[supplier]) / batch_size)} requests, "
+            f"{len(plan.carried[supplier])} carried over"
+            + (f", {unchecked} never checked" if unchecked else "")
+        )
+    return plan
@@ -0,0 +1,44 @@
+import threading
+import time
+
+
+class RequestBudget:
+    # Most requests that may be sent to a supplier, shared by every thread
+    # asking it. Retries count as they're sent like any other request.
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1):
+        # rate is in requests per second
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_update = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.last_update) * self.rate
+        )
+        self.last_update = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
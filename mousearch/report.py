@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+import os
+import pathlib
+import time
+from typing import Optional, Tuple
+
+from mousearch.bom import FARNELL_BIT, MOUSER_BIT, PartResult
+
+PARTIAL_SUFFIX = ".partial"
+# Marks stock carried over from an earlier check
+CARRIED_SYMBOL = "↺"
+
+
+def replace_atomically(output_file: pathlib.Path, content: str):
+    # Readers only ever see the old or the new file, never half of one
+    temp_file = output_file.with_name(f".{output_file.name}.tmp")
+    with open(temp_file, "w", newline="") as file:
+        file.write(content)
+    os.replace(temp_file, output_file)
+
+
+def csv_row(values: list) -> str:
+    # Quoted where needed so MPNs containing commas survive
+    line = io.StringIO()
+    csv.writer(line, lineterminator="\n").writerow(values)
+    return line.getvalue()
+
+
+def basket_rows(results: list[PartResult]) -> Tuple[str, str]:
+    # Returns the Mouser and Farnell baskets as CSV, each part is ordered
+    # from the first supplier that has stock
+    mouser_rows = []
+    farnell_rows = []
+    for part in results:
+        if part.stocked_at_mouser:
+            mouser_rows.append(csv_row([part.mpn, part.quantity]))
+        elif part.stocked_at_farnell:
+            farnell_rows.append(csv_row([part.mpn, part.quantity]))
+    return "".join(mouser_rows), "".join(farnell_rows)
+
+
+def stock_symbol(stock: Optional[int], stocked: bool, carried: bool = False) -> str:
+    if stock is None:
+        return "❓"
+    return ("✅" if stocked else "❌") + (f" {CARRIED_SYMBOL}" if carried else "")
+
+
+def stock_cell(stock: Optional[int], carried: bool = False) -> str:
+    if stock is None:
+        return "❓"
+    return f"{stock}{f' {CARRIED_SYMBOL}' if carried else ''}"
+
+
+def supply_summary(results: list[PartResult]) -> dict[str, int]:
+    # Number of BOM lines ordered from each supplier, for other tools to read
+    summary = {"parts": 0, "mouser": 0, "farnell": 0, "unavailable": 0}
+    summary.update({"issues": 0, "failed": 0, "carried": 0})
+    for part in results:
+        summary["parts"] += 1
+        summary["failed"] += part.failed
+        summary["carried"] += part.carried_over
+        if part.stocked_at_mouser:
+            summary["mouser"] += 1
+        elif part.stocked_at_farnell:
+            summary["farnell"] += 1
+        else:
+            summary["unavailable"] += 1
+        if part.score < (MOUSER_BIT | FARNELL_BIT):
+            summary["issues"] += 1
+    return summary
+
+
+def load_supply_summary(summary_file: pathlib.Path) -> Optional[dict[str, int]]:
+    try:
+        with open(summary_file) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def summary_markdown(results: list[PartResult]) -> str:
+    summary = supply_summary(results)
+    # Highlight potential issues for any part that is not
+    # in stock by every supplier
+    issues = []
+    for part in results:
+        if part.score == (MOUSER_BIT | FARNELL_BIT):
+            continue
+        mouser = stock_symbol(
+            part.mouser_stock, part.stocked_at_mouser, part.mouser_carried
+        )
+        farnell = stock_symbol(
+            part.farnell_stock, part.stocked_at_farnell, part.farnell_carried
+        )
+        issues.append(f"| {part.mpn} | {mouser} | {farnell} |")
+
+    lines = [
+        "### Supply breakdown",
+        "| Source | Mouser | Farnell | Unavailable |",
+        "| --- | --- | --- | --- |",
+        f"| Components | {summary['mouser']} | {summary['farnell']} "
+        f"| {summary['unavailable']} |",
+        "",
+        "### Issues",
+    ]
+    if issues:
+        lines += [
+            "Possible supply issues were found with the following items:",
+            "",
+            "| MPN | Mouser | Farnell |",
+            "| --- | --- | --- |",
+            *issues,
+        ]
+    else:
+        lines.append("No supply issues found")
+    if summary["failed"]:
+        lines += [
+            "",
+            f"❓ Stock couldn't be checked for {summary['failed']} parts, "
+            "they will be checked again on the next run",
+        ]
+    if summary["carried"]:
+        lines += [
+            "",
+            f"{CARRIED_SYMBOL} Stock for {summary['carried']} parts wasn't looked up "
+            "this run, it's carried over from an earlier check",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+class ReportWriter:
+    # Appends each part to the report and baskets as its lookups finish, with
+    # every result also journalled to <report>.partial, or journal_file if
+    # given. If the run is interrupted, the next one resumes from the journal
+    # rather than querying those parts again. finish() rewrites everything
+    # sorted and removes the journal, unless some lookups failed.
+    def __init__(
+        self,
+        output_file: pathlib.Path,
+        mouser_basket: pathlib.Path,
+        farnell_basket: pathlib.Path,
+        max_age: Optional[float] = None,
+        resume: bool = True,
+        journal_file: Optional[pathlib.Path] = None,
+    ):
+        # Journals older than max_age seconds are ignored, as is any journal
+        # when resume is False. journal_file keeps the journal out of a
+        # folder that's published, as it outlives the run if lookups fail.
+        self.output_file = output_file
+        self.mouser_basket = mouser_basket
+        self.farnell_basket = farnell_basket
+        self.partial_file = journal_file or output_file.with_name(
+            output_file.name + PARTIAL_SUFFIX
+        )
+        # Counts from supply_summary, e.g. report.md -> report.json
+        self.summary_file = output_file.with_suffix(".json")
+        self.results: dict[str, PartResult] = {}
+        # Stock from an interrupted run, (Mouser, Farnell) for each MPN
+        self.resumed: dict[str, Tuple[int, int]] = (
+            self._load_partial(max_age) if resume else {}
+        )
+        self.files = []
+
+    def _load_partial(self, max_age: Optional[float]) -> dict[str, Tuple[int, int]]:
+        if not self.partial_file.is_file():
+            return {}
+        if (
+            max_age is not None
+            and time.time() - self.partial_file.stat().st_mtime > max_age
+        ):
+            return {}
+        results = {}
+        with open(self.partial_file, newline="") as file:
+            for row in csv.reader(file):
+                # A crash can leave the last row half written
+                try:
+                    mpn, mouser_stock, farnell_stock = row
+                    results[mpn] = (int(mouser_stock), int(farnell_stock))
+                except ValueError:
+                    continue
+        if results:
+            print(
+                f"Resuming {self.output_file.name} with {len(results)} "
+                "parts from an interrupted run"
+            )
+        return results
+
+    def __enter__(self):
+        for x in [
+            self.output_file,
+            self.mouser_basket,
+            self.farnell_basket,
+            self.partial_file,
+        ]:
+            x.parent.mkdir(parents=True, exist_ok=True)
+        # Start from a clean journal holding only what can be resumed
+        self.journal = open(self.partial_file, "w", newline="")
+        for mpn, (mouser_stock, farnell_stock) in self.resumed.items():
+            self.journal.write(csv_row([mpn, mouser_stock, farnell_stock]))
+        self.journal.flush()
+        self.report = open(self.output_file, "w")
+        self.report.write(
+            "### Checking stock\n"
+            "| MPN | Needed | Mouser | Farnell |\n"
+            "| --- | --- | --- | --- |\n"
+        )
+        self.mouser_csv = open(self.mouser_basket, "w", newline="")
+        self.farnell_csv = open(self.farnell_basket, "w", newline="")
+        self.files = [
+            self.journal,
+            self.report,
+            self.mouser_csv,
+            self.farnell_csv,
+        ]
+        return self
+
+    def __exit__(self, *args):
+        for x in self.files:
+            x.close()
+        self.files = []
+
+    def add(self, part: PartResult):
+        self.results[part.mpn] = part
+        # Failed lookups aren't journalled so they're tried again on resume,
+        # nor is carried over stock as resuming would report it as fresh
+        if part.mpn not in self.resumed and not part.failed and not part.carried_over:
+            self.journal.write(
+                csv_row([part.mpn, part.mouser_stock, part.farnell_stock])
+            )
+        self.report.write(
+            f"| {part.mpn} | {part.quantity} "
+            f"| {stock_cell(part.mouser_stock, part.mouser_carried)} "
+            f"| {stock_cell(part.farnell_stock, part.farnell_carried)} |\n"
+        )
+        if part.stocked_at_mouser:
+            self.mouser_csv.write(csv_row([part.mpn, part.quantity]))
+        elif part.stocked_at_farnell:
+            self.farnell_csv.write(csv_row([part.mpn, part.quantity]))
+        for x in self.files:
+            x.flush()
+
+    def finish(self):
+        # Sorted with the parts nobody stocks first
+        results = sorted(self.results.values(), key=lambda x: (x.score, x.mpn))
+        mouser_rows, farnell_rows = basket_rows(results)
+        self.__exit__()
+        replace_atomically(self.mouser_basket, mouser_rows)
+        replace_atomically(self.farnell_basket, farnell_rows)
+        replace_atomically(self.output_file, summary_markdown(results))
+        replace_atomically(
+            self.summary_file, json.dumps(supply_summary(results), indent=4)
+        )
+        if not any(x.failed for x in results):
+            # Otherwise kept so the next run only retries the failed parts
+            self.partial_file.unlink(missing_ok=True)
@@ -0,0 +1,49 @@
+import threading
+from typing import Any, Optional
+
+
+class RequestLog:
+    # Timing of every supplier API request, shared between threads
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests: list[dict[str, Any]] = []
+
+    def record(
+        self,
+        supplier: str,
+        endpoint: str,
+        wall_time: float,
+        wait_time: float,
+        status: Optional[int],
+    ):
+        # wait_time is time spent waiting for the rate limiter
+        with self.lock:
+            self.requests.append(
+                {
+                    "supplier": supplier,
+                    "endpoint": endpoint,
+                    "wall_time": wall_time,
+                    "wait_time": wait_time,
+                    "status": status,
+                }
+            )
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        results: dict[str, dict[str, Any]] = {}
+        with self.lock:
+            for x in self.requests:
+                supplier = results.setdefault(
+                    x["supplier"],
+                    {"requests": 0, "wall_time": 0.0, "wait_time": 0.0, "errors": 0},
+                )
+                supplier["requests"] += 1
+                supplier["wall_time"] += x["wall_time"]
+                supplier["wait_time"] += x["wait_time"]
+                if x["status"] is None or x["status"] >= 400:
+                    supplier["errors"] += 1
+        return results
+
+    def as_dict(self) -> dict[str, Any]:
+        with self.lock:
+            requests = list(self.requests)
+        return {"summary": self.summary(), "requests": requests}
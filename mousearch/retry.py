@@ -0,0 +1,62 @@
+import logging
+import random
+import time
+from typing import Callable, Optional
+
+import requests
+
+# Seconds to wait for a supplier to answer before trying again
+REQUEST_TIMEOUT = 30
+
+
+class SupplierError(Exception):
+    # A lookup that failed and won't succeed by asking again, e.g. an
+    # invalid API key or a response that can't be understood
+    pass
+
+
+class TransientSupplierError(SupplierError):
+    # A lookup that may succeed if asked again later, e.g. rate limiting,
+    # a server error or a dropped connection
+    pass
+
+
+class BudgetExhausted(SupplierError):
+    # A lookup that wasn't sent as the supplier's request budget for this
+    # run is used up
+    pass
+
+
+def check_response(response: requests.Response, description: str):
+    if response.status_code == 429 or response.status_code >= 500:
+        raise TransientSupplierError(
+            f"{description} failed with HTTP {response.status_code}"
+        )
+    if response.status_code >= 400:
+        raise SupplierError(
+            f"{description} failed with HTTP {response.status_code}: "
+            f"{response.text[:200]}"
+        )
+
+
+def with_retries(
+    func: Callable,
+    *args,
+    attempts: int = 4,
+    base_delay: float = 2,
+    max_delay: float = 30,
+    logger: Optional[logging.Logger] = None,
+):
+    # Retries transient failures with exponential backoff. The delay is
+    # randomised ("full jitter") so workers that failed together don't all
+    # retry at the same moment.
+    for attempt in range(attempts):
+        try:
+            return func(*args)
+        except TransientSupplierError as e:
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            if logger:
+                logger.info(f"{e}, retrying in {delay:.1f}s")
+            time.sleep(delay)
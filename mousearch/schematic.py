@@ -0,0 +1,235 @@
+import argparse
+import csv
+import pathlib
+import re
+import subprocess
+import sys
+import tempfile
+from typing import Iterator, Optional
+
+from mousearch.bom import BomRow, iter_bom, read_bom
+
+# Reads a BOM straight from .kicad_sch files rather than starting KiCad to
+# export one. Only the parts of the format needed for the BOM are understood.
+
+TOKEN = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+# Root level nodes the BOM needs, everything else (e.g. the symbol
+# library cache, wires and labels) is skipped without being built
+BOM_NODES = {"uuid", "symbol", "sheet", "symbol_instances"}
+
+Node = list
+
+
+def unquote(token: str) -> str:
+    if token.startswith('"'):
+        return re.sub(r"\\(.)", r"\1", token[1:-1])
+    return token
+
+
+def iter_root_nodes(text: str, wanted: set[str]) -> Iterator[Node]:
+    # Yields each child of the root node named in wanted, one at a time
+    stack: list[Node] = []
+    depth = 0
+    skip_depth: Optional[int] = None
+    for match in TOKEN.finditer(text):
+        token = match.group()
+        if token == "(":
+            depth += 1
+            if skip_depth is None and depth >= 2:
+                stack.append([])
+        elif token == ")":
+            if skip_depth is not None:
+                if depth == skip_depth:
+                    skip_depth = None
+            elif depth >= 2:
+                node = stack.pop()
+                if stack:
+                    stack[-1].append(node)
+                else:
+                    yield node
+            depth -= 1
+        elif skip_depth is None and depth >= 2:
+            if len(stack) == 1 and not stack[0] and token not in wanted:
+                stack.pop()
+                skip_depth = depth
+                continue
+            stack[-1].append(unquote(token))
+
+
+def children(node: Node, name: str) -> Iterator[Node]:
+    for x in node[1:]:
+        if isinstance(x, list) and x and x[0] == name:
+            yield x
+
+
+def value(node: Node, name: str, default: Optional[str] = None):
+    for x in children(node, name):
+        return x[1] if len(x) > 1 else default
+    return default
+
+
+def properties(node: Node) -> dict[str, str]:
+    return {x[1]: x[2] for x in children(node, "property") if len(x) > 2}
+
+
+class SchematicFile:
+    # The nodes of one .kicad_sch the BOM needs, shared by every instance
+    # of a sheet
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.uuid: Optional[str] = None
+        self.symbols: list[Node] = []
+        self.sheets: list[Node] = []
+        # KiCad 6 keeps every reference in the root schematic
+        self.symbol_instances: dict[str, str] = {}
+        with open(path, encoding="utf-8") as file:
+            text = file.read()
+        for node in iter_root_nodes(text, BOM_NODES):
+            if node[0] == "uuid":
+                self.uuid = node[1]
+            elif node[0] == "symbol":
+                self.symbols.append(node)
+            elif node[0] == "sheet":
+                self.sheets.append(node)
+            else:
+                for x in children(node, "path"):
+                    reference = value(x, "reference")
+                    if reference:
+                        self.symbol_instances[x[1]] = reference
+
+
+class SchematicBom:
+    # MPN -> quantity for a schematic hierarchy, like
+    # kicad-cli sch export bom --exclude-dnp --group-by MPN
+    def __init__(self, top_level_schematic: pathlib.Path):
+        self.top_level_schematic = top_level_schematic
+        self.files: dict[pathlib.Path, SchematicFile] = {}
+        # (sheet path, reference) -> MPN, so each unit of a multi-unit
+        # symbol is only counted once
+        self.components: dict[tuple[tuple[str, ...], str], str] = {}
+        root = self._load(top_level_schematic)
+        self.root_uuid = root.uuid
+        self.symbol_instances = root.symbol_instances
+        self._read_sheet(top_level_schematic, ())
+
+    def _load(self, path: pathlib.Path) -> SchematicFile:
+        path = path.resolve()
+        if path not in self.files:
+            self.files[path] = SchematicFile(path)
+        return self.files[path]
+
+    def _reference(self, symbol: Node, sheet_path: tuple[str, ...]) -> str:
+        suffix = "".join(f"/{x}" for x in sheet_path)
+        # KiCad 7 onwards, each symbol lists its reference in every
+        # instance of its sheet
+        for project in children(symbol, "instances"):
+            for x in [y for z in children(project, "project") for y in z[2:]]:
+                if (
+                    isinstance(x, list)
+                    and x[0] == "path"
+                    and x[1] == f"/{self.root_uuid}{suffix}"
+                ):
+                    return value(x, "reference", "")
+        # KiCad 6
+        reference = self.symbol_instances.get(f"{suffix}/{value(symbol, 'uuid')}")
+        if reference:
+            return reference
+        return properties(symbol).get("Reference", "")
+
+    def _read_sheet(self, path: pathlib.Path, sheet_path: tuple[str, ...]):
+        schematic = self._load(path)
+        for symbol in schematic.symbols:
+            if value(symbol, "in_bom", "yes") != "yes":
+                continue
+            if value(symbol, "dnp", "no") == "yes":
+                continue
+            reference = self._reference(symbol, sheet_path)
+            # Power symbols and other virtual parts
+            if not reference or reference.startswith("#"):
+                continue
+            self.components[(sheet_path, reference)] = properties(symbol).get("MPN", "")
+
+        for sheet in schematic.sheets:
+            sheet_properties = properties(sheet)
+            file_name = sheet_properties.get(
+                "Sheetfile", sheet_properties.get("Sheet file")
+            )
+            sheet_uuid = value(sheet, "uuid")
+            if not file_name or sheet_uuid in sheet_path:
+                continue
+            self._read_sheet(path.parent / file_name, (*sheet_path, sheet_uuid))
+
+    def quantities(self) -> dict[str, int]:
+        results: dict[str, int] = {}
+        for mpn in self.components.values():
+            results[mpn] = results.get(mpn, 0) + 1
+        return results
+
+    def rows(self) -> list[BomRow]:
+        return [BomRow(mpn, x) for mpn, x in self.quantities().items()]
+
+
+def read_schematic_bom(top_level_schematic: pathlib.Path) -> list[BomRow]:
+    return SchematicBom(top_level_schematic).rows()
+
+
+def iter_bom_rows(bom: pathlib.Path) -> Iterator[BomRow]:
+    # bom is either a top level schematic to read directly or a CSV
+    # exported by kicad-cli
+    if bom.suffix != ".kicad_sch":
+        yield from iter_bom(bom)
+    else:
+        yield from read_schematic_bom(bom)
+
+
+def kicad_cli_bom(top_level_schematic: pathlib.Path) -> dict[str, int]:
+    with tempfile.TemporaryDirectory() as tmp_folder:
+        output_file = pathlib.Path(tmp_folder) / "bom.csv"
+        subprocess.check_output(
+            [
+                "kicad-cli",
+                "sch",
+                "export",
+                "bom",
+                "--output",
+                output_file,
+                "--fields",
+                "MPN,${QUANTITY}",
+                "--exclude-dnp",
+                "--group-by",
+                "MPN",
+                top_level_schematic,
+            ]
+        )
+        return {x.mpn: x.quantity for x in read_bom(output_file)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Print the BOM of a KiCad schematic hierarchy"
+    )
+    parser.add_argument("schematic", type=pathlib.Path, nargs="+")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Compare with the BOM exported by kicad-cli",
+    )
+    args = parser.parse_args()
+
+    mismatches = 0
+    for schematic in args.schematic:
+        quantities = SchematicBom(schematic).quantities()
+        if not args.check:
+            csv.writer(sys.stdout).writerows(sorted(quantities.items()))
+            continue
+        expected = kicad_cli_bom(schematic)
+        for mpn in sorted(set(quantities) | set(expected)):
+            if quantities.get(mpn) != expected.get(mpn):
+                mismatches += 1
+                print(
+                    f"{schematic}: {mpn or '(no MPN)'} read "
+                    f"{quantities.get(mpn, 0)}, kicad-cli "
+                    f"{expected.get(mpn, 0)}"
+                )
+        print(f"{schematic}: {len(expected)} BOM lines checked")
+    raise SystemExit(1 if mismatches else 0)
@@ -0,0 +1,63 @@
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+
+class StockCache:
+    def __init__(
+        self,
+        path: pathlib.Path,
+        ttl: float = 24 * 60 * 60,
+        refresh: bool = False,
+    ):
+        # ttl is in seconds, refresh ignores (but still updates) cached values
+        self.path = pathlib.Path(path)
+        self.ttl = ttl
+        self.refresh = refresh
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS stock ("
+                "supplier TEXT NOT NULL, "
+                "mpn TEXT NOT NULL, "
+                "quantity INTEGER NOT NULL, "
+                "checked REAL NOT NULL, "
+                "PRIMARY KEY (supplier, mpn))"
+            )
+
+    def get(self, supplier: str, mpn: str) -> Optional[int]:
+        if self.refresh:
+            return None
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT quantity, checked FROM stock WHERE supplier = ? AND mpn = ?",
+                (supplier, mpn),
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return row[0]
+
+    def last_seen(self, supplier: str, mpn: str) -> Optional[Tuple[int, float]]:
+        # Most recent (stock, time checked) however old, even when refreshing
+        with self.lock:
+            return self.connection.execute(
+                "SELECT quantity, checked FROM stock WHERE supplier = ? AND mpn = ?",
+                (supplier, mpn),
+            ).fetchone()
+
+    def put(self, supplier: str, mpn: str, quantity: int):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO stock (supplier, mpn, quantity, checked) "
+                "VALUES (?, ?, ?, ?)",
+                (supplier, mpn, quantity, time.time()),
+            )
+
+    def close(self):
+        self.connection.close()
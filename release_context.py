@@ -0,0 +1,60 @@
+import pathlib
+import re
+from typing import Optional
+
+import git
+
+
+class ReleaseContext:
+    # Git metadata read once per release and shared by every stage
+    def __init__(
+        self,
+        commit: str,
+        commit_message: str,
+        remote_url: Optional[str],
+    ):
+        self.commit = commit
+        self.commit_message = commit_message
+        self.remote_url = remote_url
+
+    @classmethod
+    def from_repo(cls, path: pathlib.Path) -> "ReleaseContext":
+        repo = git.Repo(path, search_parent_directories=True)
+        try:
+            remote_url = repo.remotes.origin.url
+        except AttributeError:
+            remote_url = None
+        return cls(
+            commit=repo.head.commit.hexsha,
+            commit_message=repo.head.commit.message,
+            remote_url=remote_url,
+        )
+
+    @property
+    def is_release(self) -> bool:
+        return "RELEASE:" in self.commit_message
+
+    @property
+    def short_commit(self) -> str:
+        return self.commit[:7]
+
+    @property
+    def url(self) -> Optional[str]:
+        if self.remote_url is None:
+            return None
+        url = self.remote_url
+        if url.endswith(".git"):
+            url = url[:-4]
+        return url
+
+    @property
+    def repo_name(self) -> str:
+        if self.remote_url is None:
+            return ""
+        repo_name = self.remote_url.split("/")[-1]
+        if repo_name.endswith(".git"):
+            repo_name = repo_name[:-4]
+        # Replace all underscores and hypens with spaces
+        repo_name = re.sub(r"[_-]", " ", repo_name)
+        # Capitalise each word
+        return " ".join([x.capitalize() for x in repo_name.split()])
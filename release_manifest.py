@@ -0,0 +1,117 @@
+import json
+import pathlib
+import re
+from typing import Optional, Tuple
+
+import git
+
+from release_context import ReleaseContext
+
+MANIFEST_NAME = "release-manifest.json"
+# Public list of every board's outputs for other tools
+ARTIFACTS_NAME = "artifacts.json"
+
+
+def load_manifest(release_folder: pathlib.Path) -> Optional[dict]:
+    try:
+        with open(release_folder / MANIFEST_NAME) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(
+    release_folder: pathlib.Path,
+    context: ReleaseContext,
+    projects: dict[str, dict],
+    shard: Optional[Tuple[int, int]] = None,
+):
+    # shard is (i, N) if this is one part of a sharded release
+    manifest = {"commit": context.commit, "projects": projects}
+    if shard:
+        manifest["shard"] = {"index": shard[0], "count": shard[1]}
+    release_folder.mkdir(parents=True, exist_ok=True)
+    with open(release_folder / MANIFEST_NAME, "w") as file:
+        json.dump(
+            manifest,
+            file,
+            indent=4,
+            sort_keys=True,
+        )
+
+
+def save_artifact_index(
+    release_folder: pathlib.Path,
+    context: ReleaseContext,
+    projects: dict[str, dict],
+    pages: dict[str, str],
+    stock: dict[str, dict[str, int]],
+):
+    # Artifacts are keyed by their name without the board's name,
+    # e.g. "gerbers.zip" or "front-thumb.webp"
+    boards = {}
+    for name, project in projects.items():
+        artifacts = {}
+        for x in project["artifacts"]:
+            if (release_folder / x).is_file():
+                kind = x[len(name) :].lstrip("-.") or x
+                artifacts[kind] = x
+        boards[name] = {
+            "path": project["path"],
+            "page": pages.get(name, "index.html"),
+            "artifacts": artifacts,
+            "stock": stock.get(name),
+        }
+    with open(release_folder / ARTIFACTS_NAME, "w") as file:
+        json.dump(
+            {"commit": context.commit, "url": context.url, "boards": boards},
+            file,
+            indent=4,
+            sort_keys=True,
+        )
+
+
+def changed_files(
+    top_level_folder: pathlib.Path, since: str
+) -> Optional[list[pathlib.Path]]:
+    # None if the diff can't be worked out e.g. shallow clone
+    repo = git.Repo(top_level_folder, search_parent_directories=True)
+    try:
+        diff = repo.git.diff("--name-only", since, "HEAD")
+    except git.GitCommandError:
+        return None
+    root = pathlib.Path(repo.working_tree_dir)
+    return [(root / x).absolute() for x in diff.splitlines() if x]
+
+
+def project_libraries(kicad_project: pathlib.Path) -> list[pathlib.Path]:
+    # Libraries in the project's own library tables, global libraries
+    # aren't part of the repo so can't be diffed
+    results = []
+    for table in ["fp-lib-table", "sym-lib-table"]:
+        try:
+            with open(kicad_project.parent / table) as file:
+                contents = file.read()
+        except OSError:
+            continue
+        for uri in re.findall(r'\(uri\s+"?([^")]+)"?\)', contents):
+            if "${KIPRJMOD}" not in uri:
+                continue
+            uri = uri.replace(
+                "${KIPRJMOD}", str(kicad_project.parent.absolute())
+            )
+            results.append(pathlib.Path(uri).resolve())
+    return results
+
+
+def is_project_changed(
+    kicad_project: pathlib.Path, changes: list[pathlib.Path]
+) -> bool:
+    watched = [kicad_project.parent.resolve()] + project_libraries(
+        kicad_project
+    )
+    for x in changes:
+        x = x.resolve()
+        if any(x == y or y in x.parents for y in watched):
+            return True
+    return False
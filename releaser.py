@@ -1,33 +1,64 @@
+import argparse
 import os
 import pathlib
-import re
-import subprocess
-import sys
-from typing import Optional, Tuple
-from zipfile import ZipFile
-
-import git
-import markdown2
-import pybars
+import shutil
+import tempfile
+from typing import Callable, Optional, Tuple
+
 import pypdf
 from kikit.present import readTemplate
 
-from mousearch.mousearch import Mousearch
-
-
-def run_command(commands: list[str | pathlib.Path]):
-    subprocess.check_call(
-        commands,
-        # capture_output=True,
-    )
+from archive import archive_folder, write_archive
+from artifact_cache import ArtifactCache, hash_project_inputs
+from discovery import ProjectInfo, discover_projects
+from ibom import generate_ibom
+from images import create_derivatives, image_outputs
+from kicad_cli import (
+    KicadJob,
+    kicad_cli_version,
+    run_batch,
+    run_command,
+    supports_jobsets,
+)
+from metrics import METRICS_NAME, metrics_table, write_release_metrics
+from mousearch.mousearch import BomReport, Mousearch
+from mousearch.report import PARTIAL_SUFFIX, load_supply_summary
+from mousearch.schematic import iter_bom_rows
+from release_context import ReleaseContext
+from release_manifest import (
+    changed_files,
+    is_project_changed,
+    load_manifest,
+    save_artifact_index,
+    save_manifest,
+)
+from scheduler import Scheduler
+from sharding import assign_shards, parse_shard
+from watermark import add_draft_watermark
+from webpage import (
+    TEMPLATE_FOLDER,
+    board_page_name,
+    index_pages,
+    markdown_file,
+    render_board,
+    render_page,
+    stock_status,
+)
 
 
 def discover_kicad_projects(
     top_level_folder: pathlib.Path,
-) -> list[pathlib.Path]:
-    results = list(top_level_folder.rglob("*.kicad_pro"))
+    prune: Optional[list[str]] = None,
+    hash_inputs: bool = False,
+) -> list[ProjectInfo]:
+    results = discover_projects(top_level_folder, prune, hash_inputs)
     for x in results:
-        print(f'Found project "{x.stem}" in {x.parent.absolute()}')
+        print(f'Found project "{x.path.stem}" in {x.path.parent.absolute()}')
+        if not (x.has_schematic and x.has_pcb):
+            print(
+                f'Warning: project "{x.path.stem}" is missing its '
+                f"{'schematic' if x.has_pcb else 'PCB'}"
+            )
 
     assert (
         len(results) > 0
@@ -35,56 +66,73 @@ def discover_kicad_projects(
     return results
 
 
-def create_schematic_pdf(
-    kicad_project: pathlib.Path, output_folder: pathlib.Path
+def schematic_pdf_command(
+    kicad_project: pathlib.Path, output_file: pathlib.Path
+) -> list[str | pathlib.Path]:
+    return [
+        "kicad-cli",
+        "sch",
+        "export",
+        "pdf",
+        kicad_project.with_suffix(".kicad_sch").absolute(),
+        "-o",
+        output_file.absolute(),
+        "--no-background-color",
+    ]
+
+
+def finish_schematic_pdf(
+    source_pdf: pathlib.Path,
+    output_file: pathlib.Path,
+    context: ReleaseContext,
 ):
-    temp_schematic_path = pathlib.Path(__file__).parent / "temp_schematic.pdf"
-    run_command(
-        [
-            "kicad-cli",
-            "sch",
-            "export",
-            "pdf",
-            kicad_project.with_suffix(".kicad_sch").absolute(),
-            "-o",
-            temp_schematic_path.absolute(),
-            "--no-background-color",
-        ]
-    )
+    if context.is_release:
+        shutil.move(source_pdf, output_file)
+        return
+    writer = pypdf.PdfWriter(clone_from=source_pdf)
+    add_draft_watermark(writer)
+    writer.write(output_file)
 
-    # Check if draft release and add watermarks if so
-    repo = git.Repo(pathlib.Path("."))
-    last_commit = repo.head.commit
 
-    writer = pypdf.PdfWriter(clone_from=temp_schematic_path.absolute())
+def create_schematic_pdf(
+    kicad_project: pathlib.Path,
+    output_folder: pathlib.Path,
+    context: ReleaseContext,
+):
+    output_file = output_folder / f"{kicad_project.stem}.pdf"
 
-    if "RELEASE:" not in last_commit.message:
-        # Load watermark pdfs
-        watermark_a3 = pypdf.PdfReader(
-            (
-                pathlib.Path(__file__).parent / "draft_watermark_a3.pdf"
-            ).absolute()
-        ).pages[0]
+    # Check if draft release and add watermarks if so
+    if context.is_release:
+        # Nothing to add so kicad-cli can write the final file
+        run_command(schematic_pdf_command(kicad_project, output_file))
+        return
 
-        watermark_a4 = pypdf.PdfReader(
-            (
-                pathlib.Path(__file__).parent / "draft_watermark_a4.pdf"
-            ).absolute()
-        ).pages[0]
+    # Private to this project so several schematics can be exported at once
+    with tempfile.TemporaryDirectory(
+        prefix=f"schematic-{kicad_project.stem}-"
+    ) as tmp_folder:
+        temp_schematic_path = pathlib.Path(tmp_folder) / "schematic.pdf"
+        run_command(schematic_pdf_command(kicad_project, temp_schematic_path))
+        finish_schematic_pdf(temp_schematic_path, output_file, context)
 
-        for page in writer.pages:
-            width = page.mediabox.width
-            # I have no idea where these numbers come from
-            # This was found by printing values from pages
-            # of known sizes
-            if width == 1190.52:
-                page.merge_page(watermark_a3, over=False)
-            elif width == 841.896:
-                page.merge_page(watermark_a4, over=False)
-            else:
-                raise NotImplementedError(width)
 
-    writer.write(output_folder / f"{kicad_project.stem}.pdf")
+def render_command(
+    kicad_project: pathlib.Path,
+    side: str,
+    output_file: pathlib.Path,
+    full_release: bool = True,
+) -> list[str | pathlib.Path]:
+    commands = ["kicad-cli", "pcb", "render"]
+    if full_release:
+        commands += ["--quality", "high"]
+    commands += [
+        "--side",
+        f"{'top' if side == 'front' else 'bottom'}",
+        "-o",
+        output_file.absolute(),
+        kicad_project.with_suffix(".kicad_pcb").absolute(),
+    ]
+    return commands
 
 
 def create_board_images(
@@ -92,212 +140,592 @@ def create_board_images(
     output_folder: pathlib.Path,
     full_release: bool = True,
 ):
+    renders = {}
     for side in ["front", "back"]:
-        commands = ["kicad-cli", "pcb", "render"]
-        if full_release:
-            commands += ["--quality", "high"]
-        commands += [
-            "--side",
-            f"{'top' if side == 'front' else 'bottom'}",
-            "-o",
-            (output_folder / f"{kicad_project.stem}-{side}.png").absolute(),
-            kicad_project.with_suffix(".kicad_pcb").absolute(),
-        ]
-        run_command(commands)
+        renders[side] = output_folder / f"{kicad_project.stem}-{side}.png"
+        run_command(
+            render_command(kicad_project, side, renders[side], full_release)
+        )
+
+    # Smaller copies for the webpage, full size is kept for download
+    create_derivatives(renders, output_folder, kicad_project.stem)
 
 
 def create_webpage(
+    context: ReleaseContext,
     top_level_folder: pathlib.Path,
     output_folder: pathlib.Path,
     board_list: list[Tuple[str, str, str]],
     resources: Optional[list[pathlib.Path]],
-):
-    repo = git.Repo(top_level_folder)
-
-    url = repo.remotes.origin.url
-    if url.endswith(".git"):
-        url = url[:-4]
-
-    repo_name = repo.remotes.origin.url.split("/")[-1]
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
-    # Replace all underscores and hypens with spaces
-    repo_name = re.sub(r"[_-]", " ", repo_name)
-    # Capitalise each word
-    repo_name = " ".join([x.capitalize() for x in repo_name.split()])
-
+    metrics: Optional[list[dict[str, str]]] = None,
+    previous_fragments: Optional[dict[str, dict[str, str]]] = None,
+    multi_page: bool = False,
+    stock: Optional[dict[str, dict[str, int]]] = None,
+) -> dict[str, dict[str, str]]:
+    # Returns each board's rendered section, keyed by name, so unchanged
+    # boards can reuse it in the next release. multi_page gives each board
+    # its own page, linked from an index of thumbnails and stock status.
     resources = []
+    stock = stock or {}
+    previous_fragments = previous_fragments or {}
 
     # Below is an expansion of kikit.boardpage with the broken command (which calls pcbdraw)
     # commented out as pcbdraw does not currently work and the output isn't used anyway
     output_folder.mkdir(parents=True, exist_ok=True)
-    template = readTemplate(
-        (pathlib.Path(__file__).parent / "template").absolute()
-    )
+    template = readTemplate(TEMPLATE_FOLDER.absolute())
     template.addDescriptionFile(
         str((top_level_folder.parent / "README.md").absolute())
     )
-    template.setRepository(url)
+    template.setRepository(context.url)
     template.setName(top_level_folder.absolute().stem)
     for r in resources:
         template.addResource(r)
-    for name, comment, file in board_list:
-        template.addBoard(name, comment, file)
 
     template._copyResources(output_folder)
     # self._renderBoards(outputDirectory)  # BROKEN LINE
 
-    # Render page
-    with open(
-        os.path.join(template.directory, "index.html"), encoding="utf-8"
-    ) as templateFile:
-        html_template = pybars.Compiler().compile(templateFile.read())
-        gitRev = template.gitRevision()
-        content = html_template(
+    # Each board is rendered on its own, comments are already HTML
+    fragments = {
+        name: render_board(
+            {"name": name, "comment": comment}, previous_fragments.get(name)
+        )
+        for name, comment, _ in board_list
+    }
+
+    page = {
+        "repo": template.repository,
+        "gitRev": context.commit,
+        "gitRevShort": context.short_commit,
+        "datetime": template.currentDateTime(),
+        "name": context.repo_name,
+        "description": template.description,
+        "metrics": metrics,
+    }
+    pages = {}
+    if multi_page:
+        for name, _, _ in board_list:
+            pages[board_page_name(name)] = render_page(
+                "board_page.html",
+                {
+                    **page,
+                    "board": name,
+                    "index": "index.html",
+                    "html": fragments[name]["html"],
+                },
+            )
+        boards = [
             {
-                "repo": template.repository,
-                "gitRev": gitRev,
-                "gitRevShort": gitRev[:7] if gitRev else None,
-                "datetime": template.currentDateTime(),
-                "name": repo_name,
-                "boards": template.boards,
-                "description": template.description,
+                "name": name,
+                "page": board_page_name(name),
+                "status": stock_status(stock.get(name)),
             }
+            for name, _, _ in board_list
+        ]
+        for file_name, page_boards, links in index_pages(boards):
+            pages[file_name] = render_page(
+                "board_index.html",
+                {**page, "boards": page_boards, "pages": links},
+            )
+    else:
+        pages["index.html"] = render_page(
+            "index.html",
+            {
+                **page,
+                "boards": [
+                    {"name": name, "html": fragments[name]["html"]}
+                    for name, _, _ in board_list
+                ],
+            },
         )
-        # Fix escaping of < and > symbols in pybars
-        content = re.sub("&lt;", "<", content)
-        content = re.sub("&gt;", ">", content)
 
-        # Write out file
+    # Write out files
+    for file_name, content in pages.items():
         with open(
-            os.path.join(output_folder, "index.html"), "w", encoding="utf-8"
+            os.path.join(output_folder, file_name), "w", encoding="utf-8"
         ) as outFile:
             outFile.write(content)
+    return fragments
 
 
 def create_kicad_source(
     kicad_project: pathlib.Path, output_folder: pathlib.Path
 ):
-    with ZipFile(output_folder / f"{kicad_project.stem}.zip", "w") as zip_file:
-        for x in (kicad_project.parent).glob("*"):
-            if ".git" not in str(x):
-                zip_file.write(x, x.name)
+    # Anything matching .releaseignore in the project folder is left out
+    archive_folder(
+        output_folder / f"{kicad_project.stem}.zip", kicad_project.parent
+    )
+
+
+def step_command(
+    kicad_project: pathlib.Path, output_file: pathlib.Path
+) -> list[str | pathlib.Path]:
+    return [
+        "kicad-cli",
+        "pcb",
+        "export",
+        "step",
+        "--subst-models",
+        kicad_project.with_suffix(".kicad_pcb").absolute(),
+        "-o",
+        output_file.absolute(),
+    ]
 
 
 def create_step_file(kicad_project: pathlib.Path, output_folder: pathlib.Path):
     run_command(
+        step_command(
+            kicad_project, output_folder / f"{kicad_project.stem}.step"
+        )
+    )
+
+
+def drill_command(
+    kicad_project: pathlib.Path, output_folder: pathlib.Path
+) -> list[str | pathlib.Path]:
+    return [
+        "kicad-cli",
+        "pcb",
+        "export",
+        "drill",
+        "--excellon-separate-th",
+        "-o",
+        str(output_folder.absolute())
+        + "/",  # This is awful but crashes unless ends with "/"
+        kicad_project.with_suffix(".kicad_pcb").absolute(),
+    ]
+
+
+def gerbers_command(
+    kicad_project: pathlib.Path, output_folder: pathlib.Path
+) -> list[str | pathlib.Path]:
+    return [
+        "kicad-cli",
+        "pcb",
+        "export",
+        "gerbers",
+        "--no-netlist",
+        "-o",
+        str(output_folder.absolute())
+        + "/",  # This is awful but crashes unless ends with "/"
+        kicad_project.with_suffix(".kicad_pcb").absolute(),
+    ]
+
+
+def zip_gerbers(
+    kicad_project: pathlib.Path,
+    gerber_folder: pathlib.Path,
+    output_folder: pathlib.Path,
+):
+    # Zip it, leaving out unnecessary files
+    banned_suffixes = ["gta", "gba", "gbr", "gbrjob"]
+    write_archive(
+        output_folder / f"{kicad_project.stem}-gerbers.zip",
         [
-            "kicad-cli",
-            "pcb",
-            "export",
-            "step",
-            "--subst-models",
-            kicad_project.with_suffix(".kicad_pcb").absolute(),
-            "-o",
-            (output_folder / f"{kicad_project.stem}.step").absolute(),
-        ]
+            (x, x.name)
+            for x in sorted(gerber_folder.glob("*"))
+            if x.name.split(".")[-1] not in banned_suffixes
+        ],
     )
 
 
 def create_gerbers(kicad_project: pathlib.Path, output_folder: pathlib.Path):
-    try:
-        # Setup temporary folder
-        tmp_folder = pathlib.Path() / ".." / f"gerber-{kicad_project.stem}-tmp"
-        tmp_folder.mkdir()
+    with tempfile.TemporaryDirectory(
+        prefix=f"gerber-{kicad_project.stem}-"
+    ) as tmp_folder:
+        tmp_folder = pathlib.Path(tmp_folder)
         # Generate drill files
-        run_command(
-            [
-                "kicad-cli",
-                "pcb",
-                "export",
-                "drill",
-                "--excellon-separate-th",
-                "-o",
-                str(tmp_folder.absolute())
-                + "/",  # This is awful but crashes unless ends with "/"
-                kicad_project.with_suffix(".kicad_pcb").absolute(),
+        run_command(drill_command(kicad_project, tmp_folder))
+        # Generate Gerbers
+        run_command(gerbers_command(kicad_project, tmp_folder))
+        zip_gerbers(kicad_project, tmp_folder, output_folder)
+
+
+def netlist_command(
+    kicad_project: pathlib.Path, output_file: pathlib.Path
+) -> list[str | pathlib.Path]:
+    return [
+        "kicad-cli",
+        "sch",
+        "export",
+        "netlist",
+        "--output",
+        output_file.absolute(),
+        kicad_project.with_suffix(".kicad_sch").absolute(),
+    ]
+
+
+def create_netlist(kicad_project: pathlib.Path, netlist_file: pathlib.Path):
+    run_command(netlist_command(kicad_project, netlist_file))
+
+
+def create_board_exports(
+    kicad_project: pathlib.Path,
+    output_folder: pathlib.Path,
+    context: ReleaseContext,
+    full_release: bool = True,
+    use_jobsets: bool = True,
+    netlist_file: Optional[pathlib.Path] = None,
+):
+    # Every kicad-cli export for one board, run as a single jobset
+    # so the board and its libraries are only loaded once. The netlist
+    # for ibom is left in netlist_file.
+    stem = kicad_project.stem
+    with tempfile.TemporaryDirectory(prefix=f"exports-{stem}-") as tmp_folder:
+        staging = pathlib.Path(tmp_folder)
+        jobs = [
+            KicadJob(
+                "pcb_export_drill",
+                {"excellon_separate_th": True, "output_filename": "gerbers/"},
+                ["gerbers/*.drl"],
+                drill_command(kicad_project, staging / "gerbers"),
+            ),
+            KicadJob(
+                "pcb_export_gerbers",
+                {
+                    "include_netlist_attributes": False,
+                    "output_filename": "gerbers/",
+                },
+                # Written last, once every layer has been plotted
+                ["gerbers/*.gbrjob"],
+                gerbers_command(kicad_project, staging / "gerbers"),
+            ),
+        ]
+        if full_release:
+            jobs += [
+                KicadJob(
+                    "pcb_export_3d",
+                    {
+                        "format": "step",
+                        "subst_models": True,
+                        "output_filename": "board.step",
+                    },
+                    ["board.step"],
+                    step_command(kicad_project, staging / "board.step"),
+                ),
+                KicadJob(
+                    "sch_export_netlist",
+                    {"format": "kicadsexpr", "output_filename": "board.net"},
+                    ["board.net"],
+                    netlist_command(kicad_project, staging / "board.net"),
+                ),
+                KicadJob(
+                    "sch_export_plot_pdf",
+                    {
+                        "format": "pdf",
+                        "use_background_color": False,
+                        "output_filename": "schematic.pdf",
+                    },
+                    ["schematic.pdf"],
+                    schematic_pdf_command(
+                        kicad_project, staging / "schematic.pdf"
+                    ),
+                ),
             ]
+            for side in ["front", "back"]:
+                jobs.append(
+                    KicadJob(
+                        "pcb_render",
+                        {
+                            "format": "png",
+                            "quality": "high",
+                            "side": "top" if side == "front" else "bottom",
+                            "output_filename": f"{side}.png",
+                        },
+                        [f"{side}.png"],
+                        render_command(
+                            kicad_project, side, staging / f"{side}.png"
+                        ),
+                    )
+                )
+
+        run_batch(kicad_project, jobs, staging, use_jobsets)
+
+        zip_gerbers(kicad_project, staging / "gerbers", output_folder)
+        if full_release:
+            shutil.move(staging / "board.step", output_folder / f"{stem}.step")
+            shutil.move(
+                staging / "board.net",
+                netlist_file or kicad_project.with_suffix(".net"),
+            )
+            finish_schematic_pdf(
+                staging / "schematic.pdf",
+                output_folder / f"{stem}.pdf",
+                context,
+            )
+            renders = {}
+            for side in ["front", "back"]:
+                renders[side] = output_folder / f"{stem}-{side}.png"
+                shutil.move(staging / f"{side}.png", renders[side])
+            create_derivatives(renders, output_folder, stem)
+
+
+def schedule_export(
+    scheduler: Scheduler,
+    cache: Optional[ArtifactCache],
+    input_hash: Optional[str],
+    kicad_project: pathlib.Path,
+    release_folder: pathlib.Path,
+    stage: str,
+    outputs: list[str],
+    func: Callable,
+    *args,
+    options: Optional[dict] = None,
+    depends_on: Optional[list[str]] = None,
+    **kwargs,
+) -> Optional[str]:
+    name = f"{kicad_project.stem}:{stage}"
+    if cache is None:
+        return scheduler.add(
+            name,
+            stage,
+            func,
+            kicad_project,
+            release_folder,
+            *args,
+            depends_on=depends_on,
+            outputs=[release_folder / x for x in outputs],
+            **kwargs,
         )
 
-        # Generate Gerbers
-        run_command(
-            [
-                "kicad-cli",
-                "pcb",
-                "export",
-                "gerbers",
-                "--no-netlist",
-                "-o",
-                str(tmp_folder.absolute())
-                + "/",  # This is awful but crashes unless ends with "/"
-                kicad_project.with_suffix(".kicad_pcb").absolute(),
+    key = cache.key(input_hash, stage, options)
+    if cache.restore(key, release_folder, outputs):
+        print(f"Restored {name} from artifact cache")
+        return None
+    return scheduler.add(
+        name,
+        stage,
+        cache.run,
+        key,
+        release_folder,
+        outputs,
+        func,
+        kicad_project,
+        release_folder,
+        *args,
+        depends_on=depends_on,
+        outputs=[release_folder / x for x in outputs],
+        **kwargs,
+    )
+
+
+def project_artifacts(
+    kicad_project: pathlib.Path, bom_check: bool
+) -> list[str]:
+    stem = kicad_project.stem
+    results = [
+        f"{stem}.zip",
+        f"{stem}-gerbers.zip",
+        f"{stem}.pdf",
+        *image_outputs(stem),
+        f"{stem}.step",
+        f"{stem}.html",
+    ]
+    if bom_check:
+        results += [
+            f"{stem}-bom.md",
+            f"{stem}-bom.json",
+            f"{stem}-mouser-bom.csv",
+            f"{stem}-farnell-bom.csv",
+        ]
+    return results
+
+
+def schedule_project(
+    scheduler: Scheduler,
+    cache: Optional[ArtifactCache],
+    context: ReleaseContext,
+    kicad_project: pathlib.Path,
+    release_folder: pathlib.Path,
+    bom_checker: Optional[Mousearch],
+    full_release: bool = True,
+    use_jobsets: bool = False,
+    schematic_bom: bool = False,
+    input_hash: Optional[str] = None,
+    netlist_folder: Optional[pathlib.Path] = None,
+    prune: Optional[list[str]] = None,
+) -> Tuple[Optional[str], Optional[BomReport]]:
+    # Returns the BOM export task, if any, and report for the supplier check.
+    # input_hash is hashed here, skipping the folders discovery would, if
+    # discovery didn't already. The netlist for ibom is written to
+    # netlist_folder, if given, rather than beside the project.
+    if cache and input_hash is None:
+        input_hash = hash_project_inputs(kicad_project, prune=prune)
+
+    # Do this first in case of accidential file creation in the repo
+    source = scheduler.add(
+        f"{kicad_project.stem}:source",
+        "source",
+        create_kicad_source,
+        kicad_project,
+        release_folder,
+        outputs=[release_folder / f"{kicad_project.stem}.zip"],
+    )
+
+    # Task which leaves the netlist in netlist_file, if any
+    netlist_file = (netlist_folder or kicad_project.parent) / (
+        f"{kicad_project.stem}.net"
+    )
+    netlist = None
+    if use_jobsets:
+        batch_outputs = [f"{kicad_project.stem}-gerbers.zip"]
+        if full_release:
+            batch_outputs += [
+                f"{kicad_project.stem}.pdf",
+                *image_outputs(kicad_project.stem),
+                f"{kicad_project.stem}.step",
             ]
+        netlist = schedule_export(
+            scheduler,
+            cache,
+            input_hash,
+            kicad_project,
+            release_folder,
+            "kicad-batch",
+            batch_outputs,
+            create_board_exports,
+            context,
+            full_release=full_release,
+            netlist_file=netlist_file,
+            options={
+                "release": context.is_release,
+                "full_release": full_release,
+            },
+            depends_on=[source],
         )
+    else:
+        schedule_export(
+            scheduler,
+            cache,
+            input_hash,
+            kicad_project,
+            release_folder,
+            "gerbers",
+            [f"{kicad_project.stem}-gerbers.zip"],
+            create_gerbers,
+            depends_on=[source],
+        )
+        if full_release:
+            schedule_export(
+                scheduler,
+                cache,
+                input_hash,
+                kicad_project,
+                release_folder,
+                "schematic-pdf",
+                [f"{kicad_project.stem}.pdf"],
+                create_schematic_pdf,
+                context,
+                options={"release": context.is_release},
+                depends_on=[source],
+            )
+            schedule_export(
+                scheduler,
+                cache,
+                input_hash,
+                kicad_project,
+                release_folder,
+                "images",
+                image_outputs(kicad_project.stem),
+                create_board_images,
+                full_release=full_release,
+                options={"full_release": full_release},
+                depends_on=[source],
+            )
+            schedule_export(
+                scheduler,
+                cache,
+                input_hash,
+                kicad_project,
+                release_folder,
+                "step",
+                [f"{kicad_project.stem}.step"],
+                create_step_file,
+                depends_on=[source],
+            )
 
-        # Remove unnecessary files
-        banned_suffixes = ["gta", "gba", "gbr", "gbrjob"]
-        for x in tmp_folder.glob("*"):
-            if x.name.split(".")[-1] in banned_suffixes:
-                x.unlink()
+    if full_release:
+        # Only export the netlist if ibom actually needs to run
+        ibom_outputs = [f"{kicad_project.stem}.html"]
+        if cache and cache.restore(
+            cache.key(input_hash, "ibom"), release_folder, ibom_outputs
+        ):
+            print(f"Restored {kicad_project.stem}:ibom from artifact cache")
+        else:
+            if netlist is None:
+                netlist = scheduler.add(
+                    f"{kicad_project.stem}:netlist",
+                    "netlist",
+                    create_netlist,
+                    kicad_project,
+                    netlist_file,
+                    depends_on=[source],
+                )
+            schedule_export(
+                scheduler,
+                cache,
+                input_hash,
+                kicad_project,
+                release_folder,
+                "ibom",
+                ibom_outputs,
+                generate_ibom,
+                netlist_file,
+                depends_on=[netlist],
+            )
 
-        # Zip it
-        with ZipFile(
-            output_folder / f"{kicad_project.stem}-gerbers.zip", "w"
-        ) as zip_file:
-            for x in tmp_folder.glob("*"):
-                zip_file.write(x, x.name)
+    if bom_checker is None:
+        return None, None
 
-    finally:
-        pass
-        # Erase tmp folder
-        for x in tmp_folder.glob("*"):
-            x.unlink()
-        tmp_folder.rmdir()
+    # kicad-cli exports the BOM for the supplier check unless the schematic
+    # is to be read directly
+    bom = kicad_project.with_suffix(".kicad_sch").absolute()
+    bom_csv = None
+    if not schematic_bom:
+        csv_location = (
+            pathlib.Path() / ".." / f"tmp-{kicad_project.stem}" / "bom.csv"
+        )
+        bom_csv = scheduler.add(
+            f"{kicad_project.stem}:bom-csv",
+            "bom-csv",
+            bom_checker.generate_bom,
+            bom,
+            csv_location,
+            depends_on=[source],
+        )
+        bom = csv_location
+    return bom_csv, bom_report(kicad_project.stem, release_folder, bom)
 
 
-def create_netlist(kicad_project: pathlib.Path, output_folder: pathlib.Path):
-    run_command(
-        [
-            "kicad-cli",
-            "sch",
-            "export",
-            "netlist",
-            "--output",
-            kicad_project.with_suffix(".net").absolute(),
-            kicad_project.with_suffix(".kicad_sch").absolute(),
-        ]
+def bom_report(
+    name: str, release_folder: pathlib.Path, bom: pathlib.Path
+) -> BomReport:
+    # Where the supplier check writes a project's stock report and baskets
+    tmp_folder = pathlib.Path() / ".." / f"tmp-{name}"
+    return BomReport(
+        bom=bom,
+        output_file=release_folder / f"{name}-bom.md",
+        mouser_basket=release_folder / f"{name}-mouser-bom.csv",
+        farnell_basket=release_folder / f"{name}-farnell-bom.csv",
+        # Out of the published release folder, as the journal is kept when
+        # lookups fail
+        journal_file=tmp_folder / f"bom.md{PARTIAL_SUFFIX}",
     )
 
 
-def create_ibom(kicad_project: pathlib.Path, output_folder: pathlib.Path):
-    create_netlist(kicad_project, output_folder)
-    run_command(
-        [
-            "python3",
-            "../ibom/InteractiveHtmlBom/generate_interactive_bom.py",
-            "--dark-mode",
-            "--highlight-pin1",
-            "all",
-            "--no-browser",
-            "--blacklist",
-            "JP*,LAYOUT*",
-            "--extra-fields",
-            "Manufacturer,MPN",
-            "--show-fields",
-            "Manufacturer,MPN,Value",
-            "--group-fields",
-            "MPN",
-            "--dest-dir",
-            output_folder.absolute(),
-            "--dnp-field",
-            "kicad_dnp",
-            "--name-format",
-            kicad_project.stem,
-            "--netlist-file",
-            kicad_project.with_suffix(".net").absolute(),
-            kicad_project.with_suffix(".kicad_pcb").absolute(),
-        ]
-    )
+def carry_over_project(
+    previous_release: pathlib.Path,
+    release_folder: pathlib.Path,
+    artifacts: list[str],
+) -> bool:
+    # Reuse a project's artifacts from the previous release, False if
+    # any of them are missing
+    if not all((previous_release / x).is_file() for x in artifacts):
+        return False
+    if previous_release.resolve() != release_folder.resolve():
+        release_folder.mkdir(parents=True, exist_ok=True)
+        for x in artifacts:
+            shutil.copy2(previous_release / x, release_folder / x)
+    return True
 
 
 def main(
@@ -305,63 +733,350 @@ def main(
     release_folder: pathlib.Path,
     mouser_key: Optional[str] = None,
     farnell_key: Optional[str] = None,
+    jobs: Optional[int] = None,
+    cache_dir: Optional[pathlib.Path] = None,
+    cache_size: int = 2048 * 1024 * 1024,
+    stock_ttl: float = 24 * 60 * 60,
+    refresh_stock: bool = False,
+    mouser_budget: Optional[int] = None,
+    farnell_budget: Optional[int] = None,
+    incremental: bool = False,
+    previous_release: Optional[pathlib.Path] = None,
+    jobsets: bool = True,
+    multi_page: bool = False,
+    schematic_bom: bool = False,
+    prune: Optional[list[str]] = None,
+    shard: Optional[Tuple[int, int]] = None,
 ):
+    # shard (i, N) only releases the i-th of N similarly sized groups of
+    # projects and leaves the supplier check and webpage to merge_release.py
     FULL_RELEASE = True
     print(
         f"Releasing projects in {top_level_folder.absolute()} into {release_folder.absolute()}"
     )
-    project_paths = discover_kicad_projects(top_level_folder)
+    # Inputs are hashed during discovery if the artifact cache needs them
+    projects = discover_kicad_projects(
+        top_level_folder, prune, hash_inputs=cache_dir is not None
+    )
+    if shard:
+        projects = assign_shards(projects, shard[1])[shard[0] - 1]
+        print(
+            f"Shard {shard[0]}/{shard[1]} releasing "
+            f"{', '.join(x.path.stem for x in projects) or 'nothing'}"
+        )
+    project_paths = [x.path for x in projects]
     if mouser_key and farnell_key:
-        bom_checker = Mousearch(mouser_key=mouser_key, farnell_key=farnell_key)
+        bom_checker = Mousearch(
+            mouser_key=mouser_key,
+            farnell_key=farnell_key,
+            cache_path=cache_dir / "stock.sqlite" if cache_dir else None,
+            cache_ttl=stock_ttl,
+            refresh_cache=refresh_stock,
+            mouser_budget=mouser_budget,
+            farnell_budget=farnell_budget,
+        )
     else:
         bom_checker = None
 
-    boards = []
-    for x in project_paths:
-        # Do this first in case of accidential file creation in the repo
-        create_kicad_source(x, release_folder)
-
-        create_gerbers(x, release_folder)
-        if FULL_RELEASE:
-            create_schematic_pdf(x, release_folder)
-
-            create_board_images(x, release_folder, full_release=FULL_RELEASE)
-            create_step_file(x, release_folder)
-            create_ibom(x, release_folder)
-        if bom_checker:
-            bom_checker.run(
-                x.with_suffix(".kicad_sch").absolute(),
-                release_folder / f"{x.stem}-bom.md",
-                mouser_basket=release_folder / f"{x.stem}-mouser-bom.csv",
-                farnell_basket=release_folder / f"{x.stem}-farnell-bom.csv",
-                full_release=FULL_RELEASE,
-            )
-            comment = markdown2.markdown_path(
-                (release_folder / f"{x.stem}-bom.md").absolute(),
-                extras=["fenced-code-blocks", "tables"],
+    version = kicad_cli_version()
+    use_jobsets = jobsets and supports_jobsets(version)
+    print(
+        f"Using {version}, exporting with "
+        f"{'jobsets' if use_jobsets else 'individual commands'}"
+    )
+    if cache_dir:
+        cache = ArtifactCache(cache_dir, cache_size, version)
+    else:
+        cache = None
+    context = ReleaseContext.from_repo(top_level_folder)
+
+    # Work out which projects have changed since the last release
+    previous_release = previous_release or release_folder
+    manifest = load_manifest(previous_release) if incremental else None
+    if manifest:
+        changes = changed_files(top_level_folder, manifest["commit"])
+        if changes is None:
+            print(
+                f"Unable to diff against {manifest['commit'][:7]}, "
+                "releasing every project"
             )
+    else:
+        changes = None
+
+    scheduler = Scheduler(jobs=jobs)
+    # Netlists for ibom are kept out of the repo being released
+    netlist_folder = tempfile.TemporaryDirectory(prefix="releaser-netlists-")
+    bom_csvs = []
+    bom_reports = {}
+    manifest_projects = {}
+    for project in projects:
+        x = project.path
+        artifacts = project_artifacts(x, bom_checker is not None)
+        manifest_projects[x.stem] = {
+            "path": str(x.relative_to(top_level_folder)),
+            "artifacts": artifacts,
+        }
+        if project.input_hash:
+            manifest_projects[x.stem]["input_hash"] = project.input_hash
+        previous = manifest["projects"].get(x.stem) if manifest else None
+        if (
+            changes is not None
+            and previous is not None
+            and not is_project_changed(x, changes)
+            and carry_over_project(previous_release, release_folder, artifacts)
+        ):
+            print(f"{x.stem} unchanged, reusing previous release")
+            manifest_projects[x.stem]["comment"] = previous.get("comment", "")
+            continue
+
+        bom_csv, bom_report = schedule_project(
+            scheduler,
+            cache,
+            context,
+            x,
+            release_folder,
+            bom_checker,
+            full_release=FULL_RELEASE,
+            use_jobsets=use_jobsets,
+            schematic_bom=schematic_bom,
+            input_hash=project.input_hash,
+            netlist_folder=pathlib.Path(netlist_folder.name),
+            prune=prune,
+        )
+        if bom_csv:
+            bom_csvs.append(bom_csv)
+        if bom_report:
+            bom_reports[x.stem] = bom_report
+
+    if bom_reports and not shard:
+        # Check every project's BOM together so shared parts are only
+        # looked up once
+        scheduler.add(
+            "suppliers",
+            "suppliers",
+            bom_checker.query_suppliers_for_projects,
+            list(bom_reports.values()),
+            full_release=FULL_RELEASE,
+            depends_on=bom_csvs,
+        )
+
+    try:
+        scheduler.run()
+    finally:
+        netlist_folder.cleanup()
+    scheduler.print_report()
+    metrics = write_release_metrics(
+        release_folder / METRICS_NAME,
+        context,
+        scheduler,
+        scheduler.results.get("suppliers"),
+    )
+    if cache:
+        cache.evict()
+
+    if shard:
+        # Every shard's BOMs are checked together by the merge, so parts
+        # boards share are looked up once and the suppliers' rate limits
+        # aren't shared between processes
+        for name, report in bom_reports.items():
+            manifest_projects[name]["bom"] = [
+                [x.mpn, x.quantity] for x in iter_bom_rows(report.bom)
+            ]
+
+    for x in project_paths:
+        if "comment" in manifest_projects[x.stem]:
+            # Carried over from the previous release
+            continue
+        if bom_checker and not shard:
+            comment = markdown_file(release_folder / f"{x.stem}-bom.md")
         else:
             comment = ""
+        manifest_projects[x.stem]["comment"] = comment
+
+    if shard:
+        save_manifest(release_folder, context, manifest_projects, shard)
+        return
+
+    publish_release(
+        context,
+        top_level_folder,
+        release_folder,
+        manifest_projects,
+        metrics_table(metrics),
+        previous_manifest=manifest,
+        multi_page=multi_page,
+    )
+
+
+def publish_release(
+    context: ReleaseContext,
+    top_level_folder: pathlib.Path,
+    release_folder: pathlib.Path,
+    manifest_projects: dict[str, dict],
+    metrics: Optional[list[dict[str, str]]] = None,
+    previous_manifest: Optional[dict] = None,
+    multi_page: bool = False,
+):
+    # Renders the webpage and writes the manifest and artifact list once
+    # every project's artifacts and comment are in release_folder
+    boards = []
+    stock = {}
+    for name, project in manifest_projects.items():
+        summary = load_supply_summary(release_folder / f"{name}-bom.json")
+        if summary:
+            stock[name] = summary
         boards.append(
             (
-                x.stem,
-                comment,
-                x.with_suffix(".kicad_pcb").absolute(),
+                name,
+                project["comment"],
+                (top_level_folder / project["path"])
+                .with_suffix(".kicad_pcb")
+                .absolute(),
             )
         )
 
-    create_webpage(
+    fragments = create_webpage(
+        context=context,
         top_level_folder=top_level_folder,
         output_folder=release_folder,
         board_list=boards,
         resources=[],
+        metrics=metrics,
+        previous_fragments=(
+            {
+                name: project["fragment"]
+                for name, project in previous_manifest["projects"].items()
+                if "fragment" in project
+            }
+            if previous_manifest
+            else None
+        ),
+        multi_page=multi_page,
+        stock=stock,
+    )
+    for name, fragment in fragments.items():
+        manifest_projects[name]["fragment"] = fragment
+    save_manifest(release_folder, context, manifest_projects)
+    save_artifact_index(
+        release_folder,
+        context,
+        manifest_projects,
+        {x: board_page_name(x) for x in fragments} if multi_page else {},
+        stock,
     )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate release artefacts for KiCad projects"
+    )
+    parser.add_argument("top_level_folder", type=pathlib.Path)
+    parser.add_argument("release_folder", type=pathlib.Path)
+    parser.add_argument("mouser_key", nargs="?")
+    parser.add_argument("farnell_key", nargs="?")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Maximum number of stages to run at once (default: CPU count)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=None,
+        help="Folder to cache exported artifacts in between releases",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=2048,
+        help="Maximum size of the artifact cache in MB (default: 2048)",
+    )
+    parser.add_argument(
+        "--stock-ttl",
+        type=float,
+        default=24,
+        help="Hours before a cached supplier stock lookup is checked again (default: 24)",
+    )
+    parser.add_argument(
+        "--refresh-stock",
+        action="store_true",
+        help="Query suppliers for every part even if a cached result exists",
+    )
+    parser.add_argument(
+        "--mouser-budget",
+        type=int,
+        default=None,
+        help="Most requests to send Mouser per release, the riskiest parts "
+        "are checked first and the rest carried over from the stock cache",
+    )
+    parser.add_argument(
+        "--farnell-budget",
+        type=int,
+        default=None,
+        help="Most requests to send Farnell per release, as --mouser-budget",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only release projects which have changed since the last release",
+    )
+    parser.add_argument(
+        "--previous-release",
+        type=pathlib.Path,
+        default=None,
+        help="Folder containing the last release (default: release folder)",
+    )
+    parser.add_argument(
+        "--no-jobsets",
+        action="store_true",
+        help="Run each kicad-cli export separately even if jobsets are supported",
+    )
+    parser.add_argument(
+        "--multi-page",
+        action="store_true",
+        help="Give each board its own page linked from an index of thumbnails",
+    )
+    parser.add_argument(
+        "--schematic-bom",
+        action="store_true",
+        help="Read each BOM straight from the schematic rather than having "
+        "kicad-cli export it",
+    )
+    parser.add_argument(
+        "--prune",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Folder names not to search for projects, may be repeated",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        metavar="i/N",
+        help="Only release the i-th of N groups of projects, for merge_release.py to combine",
+    )
+    args = parser.parse_args()
+
     main(
-        top_level_folder=pathlib.Path(sys.argv[1]),
-        release_folder=pathlib.Path(sys.argv[2]),
-        mouser_key=sys.argv[3],
-        farnell_key=sys.argv[4],
+        top_level_folder=args.top_level_folder,
+        release_folder=args.release_folder,
+        mouser_key=args.mouser_key,
+        farnell_key=args.farnell_key,
+        jobs=args.jobs,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size * 1024 * 1024,
+        stock_ttl=args.stock_ttl * 60 * 60,
+        refresh_stock=args.refresh_stock,
+        mouser_budget=args.mouser_budget,
+        farnell_budget=args.farnell_budget,
+        incremental=args.incremental,
+        previous_release=args.previous_release,
+        jobsets=not args.no_jobsets,
+        multi_page=args.multi_page,
+        schematic_bom=args.schematic_bom,
+        prune=args.prune,
+        shard=args.shard,
     )
@@ -0,0 +1,188 @@
+import os
+import pathlib
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from typing import Any, Callable, Optional
+
+from kicad_cli import Invocation, take_invocations
+
+
+class Task:
+    def __init__(
+        self,
+        name: str,
+        stage: str,
+        func: Callable,
+        args: tuple,
+        kwargs: dict[str, Any],
+        depends_on: list[str],
+        outputs: list[pathlib.Path],
+    ):
+        self.name = name
+        self.stage = stage
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.depends_on = depends_on
+        # Files the task creates, only used to report their size
+        self.outputs = outputs
+        self.duration: Optional[float] = None
+        # Including any commands run by the task
+        self.cpu_time: Optional[float] = None
+        self.invocations: list[Invocation] = []
+
+    @property
+    def max_rss(self) -> int:
+        # Peak memory (kB) of the largest command the task ran
+        return max((x.max_rss for x in self.invocations), default=0)
+
+    @property
+    def output_bytes(self) -> int:
+        return sum(x.stat().st_size for x in self.outputs if x.is_file())
+
+
+def _timed_call(func: Callable, args: tuple, kwargs: dict[str, Any]):
+    take_invocations()  # Discard anything left from an earlier task
+    start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    result = func(*args, **kwargs)
+    return (
+        result,
+        time.perf_counter() - start_time,
+        time.process_time() - start_cpu_time,
+        take_invocations(),
+    )
+
+
+class Scheduler:
+    def __init__(self, jobs: Optional[int] = None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.tasks: dict[str, Task] = {}
+        self.results: dict[str, Any] = {}
+        self.wall_time: Optional[float] = None
+
+    def add(
+        self,
+        name: str,
+        stage: str,
+        func: Callable,
+        *args,
+        depends_on: Optional[list[str]] = None,
+        outputs: Optional[list[pathlib.Path]] = None,
+        **kwargs,
+    ) -> str:
+        assert name not in self.tasks, f"Duplicate task {name}"
+        depends_on = depends_on or []
+        for x in depends_on:
+            assert x in self.tasks, f"{name} depends on unknown task {x}"
+        self.tasks[name] = Task(
+            name,
+            stage,
+            func,
+            args,
+            kwargs,
+            depends_on,
+            outputs or [],
+        )
+        return name
+
+    def _ready_tasks(self, pending: dict[str, Task]) -> list[Task]:
+        return [
+            x
+            for x in pending.values()
+            if all(y in self.results for y in x.depends_on)
+        ]
+
+    def run(self):
+        start_time = time.perf_counter()
+        pending = dict(self.tasks)
+        running: dict[Future, Task] = {}
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                for task in self._ready_tasks(pending):
+                    if len(running) >= self.jobs:
+                        break
+                    print(f"Starting {task.name}")
+                    del pending[task.name]
+                    future = pool.submit(
+                        _timed_call, task.func, task.args, task.kwargs
+                    )
+                    running[future] = task
+
+                assert running, (
+                    "Unable to schedule remaining tasks: "
+                    f"{', '.join(pending.keys())}"
+                )
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    try:
+                        (
+                            result,
+                            task.duration,
+                            cpu_time,
+                            task.invocations,
+                        ) = future.result()
+                    except Exception:
+                        print(f"{task.name} failed, cancelling queued tasks")
+                        for x in running:
+                            x.cancel()
+                        raise
+                    task.cpu_time = cpu_time + sum(
+                        x.cpu_time
+                        for x in task.invocations
+                        if not x.in_process
+                    )
+                    self.results[task.name] = result
+                    print(f"Finished {task.name} in {task.duration:.1f}s")
+
+        self.wall_time = time.perf_counter() - start_time
+
+    def stage_timings(self) -> dict[str, float]:
+        timings: dict[str, float] = {}
+        for x in self.tasks.values():
+            if x.duration is not None:
+                timings[x.stage] = timings.get(x.stage, 0) + x.duration
+        return timings
+
+    def print_report(self):
+        print(f"\n{'Task':<50} {'Time (s)':>10}")
+        for x in self.tasks.values():
+            if x.duration is not None:
+                print(f"{x.name:<50} {x.duration:>10.1f}")
+
+        print(f"\n{'Stage':<50} {'Total (s)':>10}")
+        for stage, duration in sorted(
+            self.stage_timings().items(), key=lambda item: -item[1]
+        ):
+            print(f"{stage:<50} {duration:>10.1f}")
+
+        invocations = [
+            (x.name, y.command, y.wall_time)
+            for x in self.tasks.values()
+            for y in x.invocations
+        ]
+        if invocations:
+            print(f"\n{'Slowest commands':<80} {'Time (s)':>10}")
+            for name, command, duration in sorted(
+                invocations, key=lambda item: -item[2]
+            )[:10]:
+                print(f"{name + ': ' + command:<80} {duration:>10.1f}")
+            print(
+                f"{len(invocations)} commands took "
+                f"{sum(x[2] for x in invocations):.1f}s in total"
+            )
+
+        if self.wall_time is not None:
+            busy_time = sum(self.stage_timings().values())
+            print(
+                f"\nWall time {self.wall_time:.1f}s "
+                f"({busy_time:.1f}s of work across {self.jobs} jobs)"
+            )
@@ -0,0 +1,43 @@
+import argparse
+from typing import Tuple
+
+from discovery import ProjectInfo
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    # "2/4" -> (2, 4), shards are numbered from 1
+    try:
+        index, count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Shard {value} isn't of the form i/N"
+        )
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            f"Shard {value} isn't between 1 and N"
+        )
+    return index, count
+
+
+def project_cost(project: ProjectInfo) -> int:
+    # Exports take roughly as long as their inputs are large, this only
+    # needs to rank boards against each other
+    return sum(x.stat().st_size for x in project.input_files)
+
+
+def assign_shards(
+    projects: list[ProjectInfo], count: int
+) -> list[list[ProjectInfo]]:
+    # The most expensive project goes to the least loaded shard each time.
+    # Every shard works this out from the same checkout so they all agree
+    # which projects are theirs.
+    costs = {x.path: project_cost(x) for x in projects}
+    shards: list[list[ProjectInfo]] = [[] for _ in range(count)]
+    loads = [0] * count
+    for project in sorted(projects, key=lambda x: (-costs[x.path], x.path)):
+        shard = min(range(count), key=lambda x: (loads[x], x))
+        shards[shard].append(project)
+        loads[shard] += costs[project.path]
+    for x in shards:
+        x.sort(key=lambda y: y.path)
+    return shards
@@ -0,0 +1,27 @@
+from artifact_cache import hash_project_inputs, project_input_files
+from discovery import discover_projects
+
+PRUNE = ["scratch*"]
+# Only the first three are inputs, the rest are in pruned folders
+FILES = [
+    "board/board.kicad_pro",
+    "board/board.kicad_sch",
+    "board/lib/parts.kicad_sym",
+    "board/board-backups/board.kicad_sch",
+    "board/node_modules/pkg/parts.kicad_sym",
+    "board/__pycache__/board.kicad_pcb",
+    "board/.git/fp-lib-table",
+    "board/scratch-old/board.kicad_pcb",
+]
+
+
+def test_discovery_and_input_files_skip_the_same_folders(tmp_path):
+    for x in FILES:
+        (tmp_path / x).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / x).write_text(x)
+
+    [project] = discover_projects(tmp_path, PRUNE, hash_inputs=True)
+    input_files = project_input_files(project.path, PRUNE)
+    assert project.input_files == input_files
+    assert input_files == sorted(tmp_path / x for x in FILES[:3])
+    assert project.input_hash == hash_project_inputs(project.path, prune=PRUNE)
@@ -0,0 +1,88 @@
+import pytest
+
+from mousearch.fake_suppliers import (
+    FakeFarnellServer,
+    FakeMouserHandler,
+    FakeMouserServer,
+)
+from mousearch.mousearch import Mousearch
+from mousearch.mouser_api import MouserAPI
+from mousearch.retry import SupplierError
+
+CATALOGUE = {"R1": 100}
+PART = {
+    "ManufacturerPartNumber": "R1",
+    "Min": "1",
+    "AvailabilityInStock": "100",
+}
+MALFORMED_RESPONSES = [
+    {"Errors": [], "SearchResults": None},
+    {"Errors": [], "SearchResults": {}},
+    {"Errors": [], "SearchResults": {"Parts": [{"Min": "1"}]}},
+    {
+        "Errors": [],
+        "SearchResults": {"Parts": [{**PART, "ManufacturerPartNumber": None}]},
+    },
+    {
+        "Errors": [],
+        "SearchResults": {"Parts": [{**PART, "AvailabilityInStock": "lots"}]},
+    },
+]
+
+
+class CannedMouserHandler(FakeMouserHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._accept_request():
+            self._send_json(self.server.response)
+
+
+class CannedMouserServer(FakeMouserServer):
+    # Answers every request with response
+    handler = CannedMouserHandler
+
+    def __init__(self, response: dict):
+        super().__init__({})
+        self.response = response
+
+
+@pytest.mark.parametrize("response", MALFORMED_RESPONSES)
+def test_malformed_response_is_a_supplier_error(response):
+    with CannedMouserServer(response) as server:
+        api = MouserAPI("key", base_url=server.url)
+        with pytest.raises(SupplierError):
+            api.check_for_stock_batch(["R1"])
+        # Asking again won't help so it isn't retried
+        assert server.request_count == 1
+
+
+def test_malformed_single_lookup_is_a_supplier_error():
+    with CannedMouserServer(MALFORMED_RESPONSES[0]) as server:
+        with pytest.raises(SupplierError):
+            MouserAPI("key", base_url=server.url).check_for_stock("R1")
+
+
+@pytest.mark.parametrize("response", MALFORMED_RESPONSES)
+def test_malformed_response_is_reported_per_part(tmp_path, response):
+    (tmp_path / "bom.csv").write_text("MPN,Quantity\nR1,2\n")
+    with (
+        CannedMouserServer(response) as mouser,
+        FakeFarnellServer(CATALOGUE) as farnell,
+    ):
+        Mousearch(
+            "key", "key", mouser_url=mouser.url, farnell_url=farnell.url
+        ).query_suppliers(
+            tmp_path / "report.md",
+            tmp_path / "mouser.csv",
+            tmp_path / "farnell.csv",
+            bom=tmp_path / "bom.csv",
+        )
+    assert "| R1 | ❓ | ✅ |" in (tmp_path / "report.md").read_text()
+    assert (tmp_path / "farnell.csv").read_text() == "R1,2\n"
+
+
+def test_well_formed_response():
+    response = {"Errors": [], "SearchResults": {"Parts": [PART]}}
+    with CannedMouserServer(response) as server:
+        api = MouserAPI("key", base_url=server.url)
+        assert api.check_for_stock_batch(["R1", "R2"]) == {"R1": 100, "R2": -1}
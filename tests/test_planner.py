@@ -0,0 +1,92 @@
+import pathlib
+
+from mousearch.fake_suppliers import (
+    FakeFarnellHandler,
+    FakeFarnellServer,
+    FakeMouserServer,
+)
+from mousearch.mousearch import Mousearch
+from mousearch.planner import plan_queries
+from mousearch.stock_cache import StockCache
+
+# Stale as soon as they're written, so only last_seen can answer
+NEEDED = {"NEW": 1, "LOW": 10, "PLENTY": 1}
+LAST_SEEN = {"LOW": 5, "PLENTY": 1000}
+
+
+def stock_cache(path: pathlib.Path) -> StockCache:
+    cache = StockCache(path, ttl=-1)
+    for supplier in ["mouser", "farnell"]:
+        for mpn, stock in LAST_SEEN.items():
+            cache.put(supplier, mpn, stock)
+    return cache
+
+
+def test_riskiest_parts_are_looked_up_first(tmp_path):
+    cache = stock_cache(tmp_path / "stock.sqlite")
+    plan = plan_queries(NEEDED, {"mouser": None, "farnell": 2}, cache)
+    assert plan.queried["farnell"] == ["NEW", "LOW"]
+    assert plan.known["farnell"] == {"PLENTY": 1000}
+    assert plan.is_carried("farnell", "PLENTY")
+
+
+def test_only_a_supplier_over_budget_carries_parts_over(tmp_path):
+    cache = stock_cache(tmp_path / "stock.sqlite")
+    plan = plan_queries(NEEDED, {"mouser": None, "farnell": 3}, cache)
+    for supplier in ["mouser", "farnell"]:
+        assert sorted(plan.queried[supplier]) == sorted(NEEDED)
+        assert plan.known[supplier] == {}
+        assert not plan.carried[supplier]
+
+
+class FlakyFarnellHandler(FakeFarnellHandler):
+    def do_GET(self):
+        # The first request is a server error, which is retried
+        if self.server.failures:
+            self.server.failures -= 1
+            self.server.request_count += 1
+            self._send_json({}, 500)
+        else:
+            super().do_GET()
+
+
+class FlakyFarnellServer(FakeFarnellServer):
+    handler = FlakyFarnellHandler
+
+    def __init__(self, catalogue: dict[str, int]):
+        super().__init__(catalogue)
+        self.failures = 1
+
+
+def test_retries_count_against_the_budget(tmp_path):
+    stock_cache(tmp_path / "stock.sqlite").close()
+    (tmp_path / "bom.csv").write_text(
+        "MPN,Quantity\n" + "".join(f"{x},{y}\n" for x, y in NEEDED.items())
+    )
+    catalogue = {x: 100 for x in NEEDED}
+    with (
+        FakeMouserServer(catalogue) as mouser,
+        FlakyFarnellServer(catalogue) as farnell,
+    ):
+        Mousearch(
+            "key",
+            "key",
+            # One at a time so NEW's lookup is the one retried
+            workers_per_supplier=1,
+            cache_path=tmp_path / "stock.sqlite",
+            cache_ttl=-1,
+            mouser_url=mouser.url,
+            farnell_url=farnell.url,
+            farnell_budget=2,
+        ).query_suppliers(
+            tmp_path / "report.md",
+            tmp_path / "mouser.csv",
+            tmp_path / "farnell.csv",
+            bom=tmp_path / "bom.csv",
+        )
+        assert farnell.request_count == 2
+    # NEW was retried, so LOW had to be carried over
+    report = (tmp_path / "report.md").read_text()
+    assert "| LOW | ✅ | ❌ ↺ |" in report
+    assert "NEW" not in report
+    assert "Stock for 2 parts wasn't looked up" in report
@@ -0,0 +1,93 @@
+import os
+import pathlib
+import time
+
+from mousearch.bom import PartResult
+from mousearch.fake_suppliers import FakeFarnellServer, FakeMouserServer
+from mousearch.mousearch import Mousearch
+from mousearch.report import PARTIAL_SUFFIX, ReportWriter
+
+DAY = 24 * 60 * 60
+# Both suppliers stock R1, the journal says neither knows it
+CATALOGUE = {"R1": 100}
+JOURNAL = "R1,-1,-1\n"
+
+
+def write_journal(folder: pathlib.Path, age: float) -> pathlib.Path:
+    (folder / "bom.csv").write_text("MPN,Quantity\nR1,2\n")
+    partial_file = folder / f"report.md{PARTIAL_SUFFIX}"
+    partial_file.write_text(JOURNAL)
+    modified = time.time() - age
+    os.utime(partial_file, (modified, modified))
+    return partial_file
+
+
+def report_writer(folder: pathlib.Path, **kwargs) -> ReportWriter:
+    return ReportWriter(
+        folder / "report.md",
+        folder / "mouser.csv",
+        folder / "farnell.csv",
+        **kwargs,
+    )
+
+
+def check_bom(folder: pathlib.Path, refresh: bool) -> tuple[int, int]:
+    # Returns the (Mouser, Farnell) requests sent
+    with (
+        FakeMouserServer(CATALOGUE) as mouser,
+        FakeFarnellServer(CATALOGUE) as farnell,
+    ):
+        Mousearch(
+            "key",
+            "key",
+            refresh_cache=refresh,
+            mouser_url=mouser.url,
+            farnell_url=farnell.url,
+        ).query_suppliers(
+            folder / "report.md",
+            folder / "mouser.csv",
+            folder / "farnell.csv",
+            bom=folder / "bom.csv",
+        )
+        return mouser.request_count, farnell.request_count
+
+
+def test_recent_journal_is_resumed(tmp_path):
+    write_journal(tmp_path, age=60)
+    writer = report_writer(tmp_path, max_age=DAY)
+    assert writer.resumed == {"R1": (-1, -1)}
+
+
+def test_old_journal_is_ignored(tmp_path):
+    write_journal(tmp_path, age=10 * DAY)
+    assert report_writer(tmp_path, max_age=DAY).resumed == {}
+
+
+def test_journal_is_ignored_without_resume(tmp_path):
+    write_journal(tmp_path, age=60)
+    assert report_writer(tmp_path, max_age=DAY, resume=False).resumed == {}
+
+
+def test_interrupted_run_is_resumed(tmp_path):
+    write_journal(tmp_path, age=60)
+    assert check_bom(tmp_path, refresh=False) == (0, 0)
+    assert (tmp_path / "mouser.csv").read_text() == ""
+
+
+def test_refresh_ignores_journal(tmp_path):
+    # However old the journal, refreshing looks every part up again
+    for age in [60, 10 * DAY]:
+        partial_file = write_journal(tmp_path, age)
+        assert check_bom(tmp_path, refresh=True) == (1, 1)
+        assert (tmp_path / "mouser.csv").read_text() == "R1,2\n"
+        assert not partial_file.exists()
+
+
+def test_journal_file_keeps_journal_out_of_report_folder(tmp_path):
+    journal_file = tmp_path / "tmp" / "report.md.partial"
+    with report_writer(tmp_path, journal_file=journal_file) as writer:
+        writer.add(PartResult("R1", 2, 100, None))
+        writer.finish()
+    # Kept for the failed Farnell lookup, but not beside the report
+    assert journal_file.read_text() == ""
+    assert not list(tmp_path.glob(f"*{PARTIAL_SUFFIX}"))
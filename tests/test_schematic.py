@@ -0,0 +1,56 @@
+import pathlib
+import shutil
+
+import pytest
+
+from mousearch.bom import read_bom
+from mousearch.schematic import SchematicBom, iter_bom_rows, kicad_cli_bom
+
+# The same hierarchy saved by KiCad 6 (references in the root schematic's
+# symbol_instances) and KiCad 7 onwards (references in each symbol's
+# instances). channel.kicad_sch is used by two sheets, and the root has
+# a two unit op-amp, a mounting hole that isn't in the BOM, a power symbol
+# and, from KiCad 7, a DNP resistor. expected-bom.csv was written by hand,
+# in the format of kicad-cli sch export bom --fields MPN,${QUANTITY}
+# --exclude-dnp --group-by MPN, rather than exported by kicad-cli. Only
+# test_matches_installed_kicad_cli compares with kicad-cli itself, and
+# only where it's installed.
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+PROJECTS = ["kicad6", "kicad7"]
+
+
+def schematic(project: str) -> pathlib.Path:
+    return FIXTURES / project / "board.kicad_sch"
+
+
+def expected_bom(project: str) -> dict[str, int]:
+    return {
+        x.mpn: x.quantity for x in read_bom(FIXTURES / project / "expected-bom.csv")
+    }
+
+
+@pytest.mark.parametrize("project", PROJECTS)
+def test_matches_kicad_cli_export(project):
+    assert SchematicBom(schematic(project)).quantities() == expected_bom(project)
+
+
+@pytest.mark.parametrize("project", PROJECTS)
+def test_each_sheet_instance_has_its_own_references(project):
+    references = sorted(x for _, x in SchematicBom(schematic(project)).components)
+    assert references == ["C10", "C20", "R1", "R10", "R20", "U1", "U10", "U20"]
+
+
+@pytest.mark.parametrize("project", PROJECTS)
+def test_schematic_and_csv_give_the_same_rows(project):
+    rows = {x.mpn: x.quantity for x in iter_bom_rows(schematic(project))}
+    csv_rows = iter_bom_rows(FIXTURES / project / "expected-bom.csv")
+    assert rows == {x.mpn: x.quantity for x in csv_rows}
+
+
+@pytest.mark.skipif(shutil.which("kicad-cli") is None, reason="Needs KiCad")
+@pytest.mark.parametrize("project", PROJECTS)
+def test_matches_installed_kicad_cli(project, tmp_path):
+    # Copied so kicad-cli can't touch the fixtures
+    shutil.copytree(FIXTURES / project, tmp_path / project)
+    path = tmp_path / project / "board.kicad_sch"
+    assert SchematicBom(path).quantities() == kicad_cli_bom(path)
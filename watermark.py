@@ -0,0 +1,63 @@
+import functools
+import pathlib
+from typing import Tuple
+
+import pypdf
+
+WATERMARK_FOLDER = pathlib.Path(__file__).parent
+# Both watermarks are landscape
+DRAFT_WATERMARKS = ["draft_watermark_a3.pdf", "draft_watermark_a4.pdf"]
+
+
+@functools.cache
+def load_watermark(name: str) -> pypdf.PageObject:
+    # Only parsed once per process, however many PDFs are watermarked
+    return pypdf.PdfReader((WATERMARK_FOLDER / name).absolute()).pages[0]
+
+
+@functools.lru_cache(maxsize=32)
+def watermark_for_size(
+    width: float, height: float
+) -> Tuple[pypdf.PageObject, pypdf.Transformation]:
+    # Use the watermark closest in area to the page to avoid scaling much
+    name = min(
+        DRAFT_WATERMARKS,
+        key=lambda x: abs(
+            float(load_watermark(x).mediabox.width)
+            * float(load_watermark(x).mediabox.height)
+            - width * height
+        ),
+    )
+    watermark = load_watermark(name)
+    watermark_width = float(watermark.mediabox.width)
+    watermark_height = float(watermark.mediabox.height)
+
+    transformation = pypdf.Transformation()
+    if height > width:
+        # Rotate landscape watermark onto portrait page
+        transformation = transformation.rotate(90).translate(
+            tx=watermark_height, ty=0
+        )
+        watermark_width, watermark_height = watermark_height, watermark_width
+
+    # Scale to fit and centre on the page
+    scale = min(width / watermark_width, height / watermark_height)
+    transformation = transformation.scale(scale, scale).translate(
+        tx=(width - watermark_width * scale) / 2,
+        ty=(height - watermark_height * scale) / 2,
+    )
+    return watermark, transformation
+
+
+def add_draft_watermark(writer: pypdf.PdfWriter):
+    for page in writer.pages:
+        box = page.mediabox
+        # Round so pages of the same nominal size share a cache entry
+        watermark, transformation = watermark_for_size(
+            round(float(box.width), 1), round(float(box.height), 1)
+        )
+        page.merge_transformed_page(
+            watermark,
+            transformation.translate(tx=float(box.left), ty=float(box.bottom)),
+            over=False,
+        )
@@ -0,0 +1,119 @@
+import functools
+import hashlib
+import json
+import pathlib
+from typing import Any, Callable, Optional
+
+import markdown2
+import pybars
+
+TEMPLATE_FOLDER = pathlib.Path(__file__).parent / "template"
+BOARD_TEMPLATE = "board.html"
+# Templates every page can include with {{> name}}
+PARTIALS = ["metrics"]
+# Boards on each page of the multi-page index
+INDEX_PAGE_SIZE = 48
+MARKDOWN_EXTRAS = ["fenced-code-blocks", "tables"]
+
+# Compiled templates keyed by the sha256 of their source
+_compiled_templates: dict[str, Callable] = {}
+
+
+def load_template(path: pathlib.Path) -> tuple[str, Callable]:
+    # Returns the template's content hash and compiled template, each
+    # version of a template is only compiled once per process
+    with open(path, encoding="utf-8") as file:
+        source = file.read()
+    content_hash = hashlib.sha256(source.encode()).hexdigest()
+    if content_hash not in _compiled_templates:
+        _compiled_templates[content_hash] = pybars.Compiler().compile(source)
+    return content_hash, _compiled_templates[content_hash]
+
+
+@functools.cache
+def _markdown() -> markdown2.Markdown:
+    return markdown2.Markdown(extras=MARKDOWN_EXTRAS)
+
+
+def markdown_file(path: pathlib.Path) -> str:
+    # One converter is reused for every file rather than one per call
+    with open(path, encoding="utf-8") as file:
+        return str(_markdown().convert(file.read()))
+
+
+def fragment_key(template_hash: str, board: dict[str, Any]) -> str:
+    return hashlib.sha256(
+        (template_hash + json.dumps(board, sort_keys=True)).encode()
+    ).hexdigest()
+
+
+def render_board(
+    board: dict[str, Any],
+    previous: Optional[dict[str, str]] = None,
+    template_folder: pathlib.Path = TEMPLATE_FOLDER,
+) -> dict[str, str]:
+    # Returns {"key", "html"} for one board's section of the page, reusing
+    # previous (from the last release's manifest) if nothing has changed
+    template_hash, template = load_template(template_folder / BOARD_TEMPLATE)
+    key = fragment_key(template_hash, board)
+    if previous and previous.get("key") == key:
+        return previous
+    return {"key": key, "html": str(template(board))}
+
+
+def render_page(
+    template_name: str,
+    context: dict[str, Any],
+    template_folder: pathlib.Path = TEMPLATE_FOLDER,
+) -> str:
+    partials = {
+        x: load_template(template_folder / f"{x}.html")[1] for x in PARTIALS
+    }
+    _, template = load_template(template_folder / template_name)
+    return str(template(context, partials=partials))
+
+
+def board_page_name(name: str) -> str:
+    # {name}.html is already the board's iBOM
+    return f"{name}-board.html"
+
+
+def index_page_name(number: int) -> str:
+    return "index.html" if number == 1 else f"index-{number}.html"
+
+
+def stock_status(summary: Optional[dict[str, int]]) -> str:
+    # One line summary of a board's BOM report for the index
+    if summary is None:
+        return ""
+    if summary["failed"]:
+        return f"❓ Stock not checked for {summary['failed']} parts"
+    if summary["issues"]:
+        return f"⚠️ Supply issues with {summary['issues']} parts"
+    return "✅ Every part in stock"
+
+
+def index_pages(
+    boards: list[dict[str, Any]], page_size: int = INDEX_PAGE_SIZE
+) -> list[tuple[str, list[dict[str, Any]], list[dict[str, Any]]]]:
+    # Splits the boards into (file name, boards, page links) for each page
+    # of the index, so no single page grows with the number of boards
+    count = max((len(boards) + page_size - 1) // page_size, 1)
+    results = []
+    for number in range(1, count + 1):
+        links = [
+            {
+                "number": x,
+                "file": index_page_name(x),
+                "current": x == number,
+            }
+            for x in range(1, count + 1)
+        ]
+        results.append(
+            (
+                index_page_name(number),
+                boards[(number - 1) * page_size : number * page_size],
+                links if count > 1 else [],
+            )
+        )
+    return results